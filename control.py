@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+import signal
+import threading
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG = os.path.join(HERE, 'config.yaml')
+
+
+def load_config(path: str) -> Dict:
+    import yaml  # PyYAML нужен только для чтения config.yaml
+
+    with open(path) as f:
+        doc = yaml.safe_load(f) or {}
+    if not isinstance(doc, dict):
+        raise ValueError(f"{path}: ожидался словарь разделов")
+    return doc
+
+
+def merge_config(current: Dict, section: Dict, renames: Optional[Dict[str, Tuple[str, float]]] = None,
+                 restart_required: Iterable[str] = ()) -> Tuple[Dict, Dict]:
+    """
+    Новая конфигурация = current + значения section. renames: ключ
+    config.yaml -> (ключ current, множитель единиц). Ключи из restart_required
+    не меняются на ходу. Ошибка типа в любом ключе - ValueError, и не
+    применяется ничего. Возвращает (новый словарь, отчет).
+    """
+    renames = renames or {}
+    merged = dict(current)
+    report = {'applied': {}, 'unchanged': [], 'ignored': [], 'restart_required': []}
+
+    for yaml_key, value in (section or {}).items():
+        key, factor = renames.get(yaml_key, (yaml_key, 1))
+        if key not in current:
+            report['ignored'].append(yaml_key)
+            continue
+
+        old = current[key]
+        if isinstance(old, bool):
+            if not isinstance(value, bool):
+                raise ValueError(f"{yaml_key}: ожидалось true/false, получено {value!r}")
+        elif isinstance(old, (int, float)):
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                raise ValueError(f"{yaml_key}: ожидалось неотрицательное число, получено {value!r}")
+            value = value * factor
+            value = int(value) if isinstance(old, int) else float(value)
+        elif type(value) is not type(old):
+            raise ValueError(f"{yaml_key}: ожидался {type(old).__name__}, получено {value!r}")
+
+        if value == old:
+            report['unchanged'].append(key)
+        elif key in restart_required:
+            report['restart_required'].append(key)
+        else:
+            merged[key] = value
+            report['applied'][key] = value
+    return merged, report
+
+
+class ConfigReloader:
+    """
+    Перечитывание config.yaml: файл читается и проверяется целиком, затем
+    apply(doc, startup) применяет его одной заменой. Ошибка чтения или
+    проверки оставляет прежнюю конфигурацию. Перезагрузки сериализованы.
+    startup=True - первое применение до создания сервера: действуют и ключи,
+    которые на ходу требуют перезапуска.
+    """
+
+    def __init__(self, path: str, apply: Callable[[Dict, bool], Dict]):
+        self.path = path
+        self.apply = apply
+        self.reloads = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def reload(self, startup: bool = False) -> Dict:
+        with self._lock:
+            try:
+                report = self.apply(load_config(self.path), startup)
+            except Exception as e:
+                self.failures += 1
+                return {'reloaded': False, 'path': self.path, 'error': str(e)}
+            self.reloads += 1
+            return {'reloaded': True, 'path': self.path, **report}
+
+
+def config_path_from_argv(argv) -> Optional[str]:
+    """--config=PATH или None"""
+    for arg in argv:
+        if arg.startswith('--config='):
+            return arg.split('=', 1)[1]
+    return None
+
+
+def print_reload(report: Dict):
+    if report['reloaded']:
+        print(f" Конфигурация {report['path']} перечитана: применено {report['applied'] or '-'}"
+              + (f", нужен перезапуск: {report['restart_required']}" if report['restart_required'] else ""))
+    else:
+        print(f" Конфигурация {report['path']} не применена: {report['error']}")
+
+
+def serve(server, reloader: Optional[ConfigReloader] = None, drain_s: float = 10.0,
+          ready: Optional[Callable[[], None]] = None) -> bool:
+    """
+    serve_forever с управлением сигналами: SIGHUP - перечитать конфигурацию
+    без перезапуска (кеши, окна лимитов и БД остаются теплыми), SIGTERM/SIGINT -
+    перестать принимать соединения и дождаться запросов в работе
+    (server.drain(drain_s), если сервер его поддерживает). ready() -
+    после установки обработчиков, до serve_forever. True - все запросы
+    завершились до закрытия.
+    """
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        if stopping.is_set():
+            return
+        stopping.set()
+        # shutdown() ждет выхода serve_forever - только из другого потока
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    def reload(signum, frame):
+        # Обработчик сигнала прерывает главный поток где угодно, в том числе
+        # внутри reload() с захваченной блокировкой - перечитывание в своем потоке
+        threading.Thread(target=lambda: print_reload(reloader.reload()), daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    if reloader is not None and hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, reload)
+    if ready is not None:
+        ready()
+
+    server.serve_forever()
+
+    drained = True
+    if hasattr(server, 'drain'):
+        started = time.monotonic()
+        print(f" Остановка: ожидание запросов в работе (до {drain_s:g} с)...", file=sys.stderr)
+        drained = server.drain(drain_s)
+        print(f" {'Все запросы завершены' if drained else 'Не дождались всех запросов'} "
+              f"за {time.monotonic() - started:.2f} с", file=sys.stderr)
+    server.server_close()
+    return drained
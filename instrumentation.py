@@ -0,0 +1,238 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# Границы корзин гистограмм (нс): от 10 мкс до 100 мс
+LATENCY_BUCKETS_NS = (
+    10_000, 25_000, 50_000, 100_000, 250_000, 500_000,
+    1_000_000, 2_500_000, 5_000_000, 10_000_000, 25_000_000, 50_000_000, 100_000_000,
+)
+
+
+class PhaseTimer:
+    """Замер именованных фаз одного запроса на perf_counter_ns"""
+
+    __slots__ = ('start_ns', 'phases', '_last_ns')
+
+    def __init__(self):
+        self.start_ns = time.perf_counter_ns()
+        self._last_ns = self.start_ns
+        self.phases = []
+
+    def mark(self, name: str):
+        """Закрыть фазу, длившуюся с предыдущей отметки"""
+        now = time.perf_counter_ns()
+        self.phases.append((name, now - self._last_ns))
+        self._last_ns = now
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            self.phases.append((name, end - start))
+            self._last_ns = end
+
+    def total_ns(self) -> int:
+        return time.perf_counter_ns() - self.start_ns
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing (dur в миллисекундах)"""
+        parts = [f"{name};dur={ns / 1e6:.3f}" for name, ns in self.phases]
+        parts.append(f"total;dur={self.total_ns() / 1e6:.3f}")
+        return ', '.join(parts)
+
+
+class _Histogram:
+
+    __slots__ = ('counts', 'sum_ns', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_NS) + 1)
+        self.sum_ns = 0
+        self.count = 0
+
+    def observe(self, value_ns: int):
+        i = 0
+        for bound in LATENCY_BUCKETS_NS:
+            if value_ns <= bound:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.sum_ns += value_ns
+        self.count += 1
+
+
+def _merge_histogram(merged: Dict, key, hist: _Histogram):
+    acc = merged.get(key)
+    if acc is None:
+        acc = merged[key] = _Histogram()
+    acc.counts = [a + b for a, b in zip(acc.counts, hist.counts)]
+    acc.sum_ns += hist.sum_ns
+    acc.count += hist.count
+
+
+def _render_histogram(lines: List[str], name: str, labels: str, hist: _Histogram):
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS_NS, hist.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound / 1e9:g}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+    lines.append(f'{name}_sum{{{labels}}} {hist.sum_ns / 1e9:.9f}')
+    lines.append(f'{name}_count{{{labels}}} {hist.count}')
+
+
+class _Striped:
+    """
+    Фиксированное число полос (словарь + своя блокировка), полоса выбирается
+    по id потока ОС. Потоки разных запросов редко делят полосу, память не
+    растет с числом потоков (ThreadingHTTPServer создает поток на запрос),
+    полосы суммируются только при чтении /metrics.
+    """
+
+    STRIPES = 16
+
+    def __init__(self, known_paths=(), stripes: Optional[int] = None):
+        self.known_paths = frozenset(known_paths)
+        self._stripes: List[Tuple[Dict, threading.Lock]] = [
+            ({}, threading.Lock()) for _ in range(stripes or self.STRIPES)
+        ]
+
+    @contextmanager
+    def _shard(self):
+        # native id - последовательный TID, в отличие от выровненного get_ident()
+        shard, lock = self._stripes[threading.get_native_id() % len(self._stripes)]
+        with lock:
+            yield shard
+
+    def _all_shards(self) -> Iterator[Dict]:
+        """Полосы по очереди; тело цикла читателя выполняется под блокировкой полосы"""
+        for shard, lock in self._stripes:
+            with lock:
+                yield shard
+
+    def label(self, path: str) -> str:
+        # Неизвестные пути сворачиваются, чтобы число рядов было ограничено
+        return path if path in self.known_paths else 'other'
+
+
+class PhaseMetrics(_Striped):
+    """Гистограммы фаз запроса по endpoint'ам"""
+
+    def observe(self, path: str, timer: PhaseTimer):
+        path = self.label(path)
+        total_ns = timer.total_ns()
+        with self._shard() as shard:
+            for name, ns in timer.phases:
+                key = (path, name)
+                hist = shard.get(key)
+                if hist is None:
+                    hist = shard[key] = _Histogram()
+                hist.observe(ns)
+
+            key = (path, 'total')
+            hist = shard.get(key)
+            if hist is None:
+                hist = shard[key] = _Histogram()
+            hist.observe(total_ns)
+
+    def snapshot(self) -> Dict:
+        merged = {}
+        for shard in self._all_shards():
+            for key, hist in shard.items():
+                _merge_histogram(merged, key, hist)
+        return merged
+
+    def render(self, prefix: str = 'hft') -> str:
+        """Гистограммы в текстовом формате Prometheus"""
+        name = f"{prefix}_phase_seconds"
+        lines = [
+            f"# HELP {name} Время фаз обработки запроса",
+            f"# TYPE {name} histogram",
+        ]
+        for (path, phase), hist in sorted(self.snapshot().items()):
+            _render_histogram(lines, name, f'path="{path}",phase="{phase}"', hist)
+        return '\n'.join(lines) + '\n'
+
+
+class RequestMetrics(_Striped):
+    """Счетчики запросов по пути и коду ответа, гистограммы задержки и события"""
+
+    def observe(self, path: str, status: Optional[int], duration_ns: int):
+        path = self.label(path)
+        with self._shard() as shard:
+            key = ('requests', path, status or 0)
+            shard[key] = shard.get(key, 0) + 1
+
+            key = ('latency', path)
+            hist = shard.get(key)
+            if hist is None:
+                hist = shard[key] = _Histogram()
+            hist.observe(duration_ns)
+
+    def inc(self, event: str, amount: int = 1):
+        """Счетчик события (отказы rate limit, блокировки и т.п.)"""
+        key = ('event', event)
+        with self._shard() as shard:
+            shard[key] = shard.get(key, 0) + amount
+
+    def snapshot(self) -> Tuple[Dict, Dict, Dict]:
+        requests, latency, events = {}, {}, {}
+        for shard in self._all_shards():
+            for key, value in shard.items():
+                kind = key[0]
+                if kind == 'requests':
+                    requests[key[1:]] = requests.get(key[1:], 0) + value
+                elif kind == 'latency':
+                    _merge_histogram(latency, key[1], value)
+                else:
+                    events[key[1]] = events.get(key[1], 0) + value
+        return requests, latency, events
+
+    def render(self, prefix: str = 'hft', events=(), gauges: Optional[Dict] = None) -> str:
+        """
+        Текст Prometheus: запросы, задержка, счетчики событий и gauges.
+        events - имена счетчиков, выводимых даже при нуле;
+        gauges - {имя: (описание, значение)}, значения снимаются при чтении.
+        """
+        requests, latency, counted = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_requests_total Обработанные запросы по пути и коду ответа",
+            f"# TYPE {prefix}_requests_total counter",
+        ]
+        for (path, code), value in sorted(requests.items()):
+            lines.append(f'{prefix}_requests_total{{path="{path}",code="{code}"}} {value}')
+
+        name = f"{prefix}_request_duration_seconds"
+        lines.append(f"# HELP {name} Полное время обработки запроса")
+        lines.append(f"# TYPE {name} histogram")
+        for path, hist in sorted(latency.items()):
+            _render_histogram(lines, name, f'path="{path}"', hist)
+
+        for event in sorted(set(events) | set(counted)):
+            name = f"{prefix}_{event}_total"
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {counted.get(event, 0)}")
+
+        for gauge, (description, value) in (gauges or {}).items():
+            name = f"{prefix}_{gauge}"
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+
+class ShardedCounter(_Striped):
+    """Сумматор без общей блокировки: слагаемое на каждую полосу"""
+
+    def add(self, amount: int = 1):
+        with self._shard() as shard:
+            shard['value'] = shard.get('value', 0) + amount
+
+    def value(self) -> int:
+        return sum(shard.get('value', 0) for shard in self._all_shards())
@@ -0,0 +1,184 @@
+import time
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from lockout import TimingWheel
+
+
+ADMITTED = 'admitted'
+BLACKLISTED = 'blacklisted'
+RATE_LIMITED = 'rate_limited'
+
+
+class IPRecord:
+    """
+    Состояние одного IP: окно лимита частоты, черный список, история
+    запросов и всплеск атак. __slots__ - без словаря на экземпляр,
+    сотни тысяч записей остаются компактными.
+    """
+
+    __slots__ = (
+        'window', 'window_count', 'previous_count',
+        'blocked_until', 'attack_second', 'attack_count',
+        'first_seen', 'last_seen', 'requests', 'rejected',
+    )
+
+    def __init__(self, now: float):
+        self.window = int(now)
+        self.window_count = 0
+        self.previous_count = 0
+        self.blocked_until = 0.0
+        self.attack_second = 0
+        self.attack_count = 0
+        self.first_seen = now
+        self.last_seen = now
+        self.requests = 0
+        self.rejected = 0
+
+    def rate(self, now: float) -> float:
+        """
+        Запросов за последнюю секунду: скользящее окно из двух счетчиков
+        (текущая секунда + доля предыдущей) вместо списка меток времени.
+        """
+        window = int(now)
+        if window != self.window:
+            self.previous_count = self.window_count if window == self.window + 1 else 0
+            self.window_count = 0
+            self.window = window
+        return self.window_count + self.previous_count * (1.0 - (now - window))
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class IPStateTable:
+    """
+    Состояние по IP, разбитое на shards частей со своей блокировкой
+    (часть = hash(ip) % shards): потоки с разных IP почти не конкурируют,
+    каждая проверка - один захват одной блокировки. Размер части ограничен,
+    при переполнении вытесняется давно не активный IP (порядок dict -
+    порядок последней активности). Сроки блокировок стоят в колесе таймеров
+    своей части, sweep() снимает истекшие за O(1) на блокировку и удаляет
+    записи, простаивающие дольше idle_s.
+    """
+
+    def __init__(self, shards: int = 64, max_entries: int = 100000, idle_s: float = 60.0,
+                 tick_s: float = 1.0):
+        self.shards = shards
+        self.max_per_shard = max(1, max_entries // shards)
+        self.idle_s = idle_s
+        self._records: List[Dict[str, IPRecord]] = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        # blocked_until - по time.time(), колеса идут по тем же часам
+        self._wheels = [TimingWheel(tick_s, start=time.time()) for _ in range(shards)]
+        self.evicted = 0
+        self.expired = 0
+        self.unblocked = 0
+
+    def _shard(self, ip: str) -> Tuple[threading.Lock, Dict[str, IPRecord]]:
+        index = hash(ip) % self.shards
+        return self._locks[index], self._records[index]
+
+    def _touch(self, records: Dict[str, IPRecord], ip: str, now: float) -> IPRecord:
+        record = records.pop(ip, None)
+        if record is None:
+            record = IPRecord(now)
+            if len(records) >= self.max_per_shard:
+                del records[next(iter(records))]
+                self.evicted += 1
+        records[ip] = record
+        record.last_seen = now
+        return record
+
+    def admit(self, ip: str, rate_limit: Optional[int] = None, check_blacklist: bool = True) -> str:
+        """
+        Допуск запроса: черный список, затем лимит частоты (None - без
+        лимита), учет в истории. ADMITTED, BLACKLISTED или RATE_LIMITED.
+        """
+        now = time.time()
+        lock, records = self._shard(ip)
+        with lock:
+            record = self._touch(records, ip, now)
+            record.requests += 1
+            if check_blacklist and record.blocked_until > now:
+                record.rejected += 1
+                return BLACKLISTED
+            if rate_limit is not None and record.rate(now) >= rate_limit:
+                record.rejected += 1
+                return RATE_LIMITED
+            record.window_count += 1
+            return ADMITTED
+
+    def block(self, ip: str, seconds: float):
+        now = time.time()
+        index = hash(ip) % self.shards
+        with self._locks[index]:
+            record = self._touch(self._records[index], ip, now)
+            record.blocked_until = max(record.blocked_until, now + seconds)
+            self._wheels[index].schedule(ip, record.blocked_until)
+
+    def is_blocked(self, ip: str) -> bool:
+        lock, records = self._shard(ip)
+        with lock:
+            record = records.get(ip)
+            return record is not None and record.blocked_until > time.time()
+
+    def record_attack(self, ip: str, burst_limit: int) -> bool:
+        """Подозрительное событие от IP; True - больше burst_limit за секунду"""
+        now = time.time()
+        lock, records = self._shard(ip)
+        with lock:
+            record = self._touch(records, ip, now)
+            second = int(now)
+            if record.attack_second != second:
+                record.attack_second = second
+                record.attack_count = 0
+            record.attack_count += 1
+            return record.attack_count > burst_limit
+
+    def get(self, ip: str) -> Optional[Dict]:
+        lock, records = self._shard(ip)
+        with lock:
+            record = records.get(ip)
+            return record.as_dict() if record is not None else None
+
+    def blocked(self) -> List[str]:
+        now = time.time()
+        result = []
+        for lock, records in zip(self._locks, self._records):
+            with lock:
+                result.extend(ip for ip, record in records.items() if record.blocked_until > now)
+        return result
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """
+        Снять истекшие блокировки (колесо таймеров) и удалить записи,
+        простаивающие дольше idle_s. Возвращает число удаленных записей.
+        """
+        now = time.time() if now is None else now
+        idle_before = now - self.idle_s
+        removed = 0
+        for lock, records, wheel in zip(self._locks, self._records, self._wheels):
+            with lock:
+                for ip in wheel.advance(now):
+                    record = records.get(ip)
+                    # Блокировку могли продлить - тогда в колесе есть более поздний тик
+                    if record is not None and 0 < record.blocked_until <= now:
+                        record.blocked_until = 0.0
+                        self.unblocked += 1
+                # Порядок dict - порядок активности: простаивающие в начале.
+                # Обход останавливается и на заблокированной записи: она
+                # снимется колесом, и следующий sweep пойдет дальше
+                stale = []
+                for ip, record in records.items():
+                    if record.last_seen > idle_before or record.blocked_until > now:
+                        break
+                    stale.append(ip)
+                for ip in stale:
+                    del records[ip]
+                removed += len(stale)
+        self.expired += removed
+        return removed
+
+    def __len__(self) -> int:
+        return sum(len(records) for records in self._records)
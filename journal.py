@@ -0,0 +1,135 @@
+import json
+import os
+import time
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+class ProbeJournal:
+    """
+    Журнал прогресса атаки: append-only JSON Lines, запись пачками.
+    При повторном запуске журнал проигрывается: уверенные решения проверок
+    берутся из него без запросов, решения с низкой уверенностью
+    перепроверяются, калибровка оракула восстанавливается.
+
+    Записи:
+      run          - начало запуска (цель)
+      calibration  - состояние оракула после калибровки
+      probe        - решение проверки условия и уверенность (доля согласных замеров)
+      char         - извлеченный символ позиции (для отчета о прогрессе)
+    """
+
+    def __init__(self, path: str, base_url: str, min_confidence: float = 0.8,
+                 batch_size: int = 64, flush_interval: float = 1.0):
+        self.path = path
+        self.base_url = base_url
+        self.min_confidence = min_confidence
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.probes: Dict[str, Tuple[bool, float]] = {}
+        self.chars: Dict[Tuple[str, int], str] = {}
+        self.calibration: Dict[str, Dict] = {}
+        self.replayed = 0
+        self.to_verify = 0
+        self.reused = 0
+
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+        complete = self._replay()
+        self._file = open(path, 'a', encoding='utf-8')
+        # Оборванный хвост отрезается, иначе новые записи приклеятся к нему
+        if self._file.tell() > complete:
+            self._file.truncate(complete)
+        self._append({'t': 'run', 'base_url': base_url, 'ts': time.time()})
+
+    def _replay(self) -> int:
+        """Проигрывает журнал; возвращает длину в байтах до конца последней целой строки"""
+        if not os.path.exists(self.path):
+            return 0
+
+        current_target = None
+        complete = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                # Строка без перевода - оборвана аварийным завершением
+                if not line.endswith(b'\n'):
+                    break
+                complete += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+
+                kind = entry.get('t')
+                if kind == 'run':
+                    current_target = entry.get('base_url')
+                    continue
+                # Решения для другой цели не переносятся
+                if current_target != self.base_url:
+                    continue
+
+                if kind == 'probe':
+                    self.probes[entry['cond']] = (entry['result'], entry['conf'])
+                elif kind == 'char':
+                    self.chars[(entry['query'], entry['pos'])] = entry['char']
+                elif kind == 'calibration':
+                    self.calibration[entry['mode']] = entry['state']
+
+        self.replayed = len(self.probes)
+        self.to_verify = sum(1 for _, conf in self.probes.values() if conf < self.min_confidence)
+        return complete
+
+    def lookup(self, condition: str) -> Optional[bool]:
+        """Уверенное решение из журнала или None (нужна проверка)"""
+        cached = self.probes.get(condition)
+        if cached is None or cached[1] < self.min_confidence:
+            return None
+        self.reused += 1
+        return cached[0]
+
+    def record_probe(self, condition: str, result: bool, confidence: float):
+        self.probes[condition] = (result, confidence)
+        self._append({'t': 'probe', 'cond': condition, 'result': result, 'conf': round(confidence, 3)})
+
+    def record_char(self, query: str, position: int, char: str):
+        self.chars[(query, position)] = char
+        self._append({'t': 'char', 'query': query, 'pos': position, 'char': char})
+
+    def record_calibration(self, mode: str, state: Dict):
+        self.calibration[mode] = state
+        self._append({'t': 'calibration', 'mode': mode, 'state': state})
+        self.flush()
+
+    def known_prefix(self, query: str) -> str:
+        chars = []
+        position = 1
+        while (query, position) in self.chars:
+            chars.append(self.chars[(query, position)])
+            position += 1
+        return ''.join(chars)
+
+    def _append(self, entry: Dict):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._buffer.append(line)
+            due = (len(self._buffer) >= self.batch_size
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._buffer:
+                return
+            self._file.write('\n'.join(self._buffer) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._buffer.clear()
+            self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._file.close()
@@ -0,0 +1,273 @@
+import os
+import sys
+import time
+import signal
+import select
+import threading
+import subprocess
+import importlib.util
+from http.server import HTTPServer
+from typing import Dict, List, Optional
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Тип сервера -> (файл модуля, имя модуля)
+SERVERS = {
+    'vulnerable': ('server.py', 'server'),
+    'secure': ('server def.py', 'server_def'),
+}
+
+_modules: Dict[str, object] = {}
+_modules_lock = threading.Lock()
+
+
+def load_server_module(kind: str):
+    """Модуль сервера; 'server def.py' из-за пробела загружается по пути"""
+    with _modules_lock:
+        if kind not in _modules:
+            filename, name = SERVERS[kind]
+            module = sys.modules.get(name)
+            if module is None:
+                spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+                module = importlib.util.module_from_spec(spec)
+                sys.modules[name] = module
+                spec.loader.exec_module(module)
+            _modules[kind] = module
+        return _modules[kind]
+
+
+def handler_class(kind: str):
+    module = load_server_module(kind)
+    return module.HFTSecureSQLiServer if kind == 'secure' else module.HFTVulnerableSQLiServer
+
+
+def create_server(kind: str, host: str = '127.0.0.1', port: int = 0):
+    """
+    Сервер, уже слушающий сокет. port=0 - порт выбирает ОС, свободный
+    в момент bind (без гонки отдельной проверки порта).
+    """
+    module = load_server_module(kind)
+    if kind == 'secure':
+        return module.HFTSecureHTTPServer((host, port))
+    return HTTPServer((host, port), module.HFTVulnerableSQLiServer)
+
+
+def configure(kind: str, config_path: str) -> Dict:
+    """
+    Применить config.yaml к классу обработчика (до создания серверов,
+    включая ключи, которые на ходу требуют перезапуска) и включить
+    /admin/reload с этим файлом. Ошибка в файле - ValueError.
+    """
+    from control import ConfigReloader
+
+    handler = handler_class(kind)
+    reloader = ConfigReloader(config_path, handler.apply_config)
+    report = reloader.reload(startup=True)
+    if not report['reloaded']:
+        raise ValueError(f"{config_path}: {report['error']}")
+    handler.RELOADER = reloader
+    return report
+
+
+class ServerInstance:
+    """Запущенный экземпляр сервера в потоке или в отдельном процессе"""
+
+    def __init__(self, kind: str, host: str, port: int, server=None, thread=None, process=None):
+        self.kind = kind
+        self.host = host
+        self.port = port
+        self.server = server
+        self.thread = thread
+        self.process = process
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def stop(self, timeout: float = 5.0):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join(timeout)
+            self.server = None
+        elif self.process is not None:
+            if self.process.poll() is None:
+                self.process.send_signal(signal.SIGTERM)
+                try:
+                    self.process.wait(timeout)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+                    self.process.wait()
+            self.process.stdout.close()
+            self.process = None
+
+
+def _start_thread(kind: str, host: str) -> ServerInstance:
+    server = create_server(kind, host)
+    thread = threading.Thread(target=server.serve_forever, name=f"{kind}-{server.server_address[1]}",
+                              daemon=True)
+    thread.start()
+    return ServerInstance(kind, host, server.server_address[1], server=server, thread=thread)
+
+
+def _start_process(kind: str, host: str, burners: int = 0, config_path: Optional[str] = None) -> subprocess.Popen:
+    args = [sys.executable, os.path.abspath(__file__), '--serve', kind, '--host', host,
+            '--burners', str(burners)]
+    if config_path:
+        args += ['--config', os.path.abspath(config_path)]
+    return subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, cwd=HERE)
+
+
+def _wait_ready(process: subprocess.Popen, kind: str, host: str, deadline: float) -> ServerInstance:
+    # Потомок печатает "READY <порт>" после bind и listen
+    remaining = deadline - time.monotonic()
+    ready, _, _ = select.select([process.stdout], [], [], max(remaining, 0))
+    line = process.stdout.readline().decode().split() if ready else []
+    if len(line) != 2 or line[0] != 'READY':
+        process.kill()
+        process.wait()
+        process.stdout.close()
+        raise RuntimeError(f"Сервер {kind} не запустился (код {process.returncode})")
+    return ServerInstance(kind, host, int(line[1]), process=process)
+
+
+class ServerCluster:
+    """
+    N экземпляров сервера на портах, выбранных ОС.
+
+    mode='thread'  - в этом процессе; экземпляры одного типа делят состояние
+                     уровня класса (метрики, кэши, черный список)
+    mode='process' - каждый в своем процессе, состояние изолировано
+
+    Конструктор возвращается, когда все экземпляры принимают соединения.
+    Используется как контекстный менеджер: выход останавливает все экземпляры.
+    burners > 0 - потоки-нагрузчики CPU (loadgen.CpuBurner) в процессе сервера.
+    config_path - config.yaml для экземпляров (см. configure); в режиме
+    'thread' применяется к классу обработчика в этом процессе.
+    """
+
+    def __init__(self, kind: str = 'vulnerable', count: int = 1, mode: str = 'thread',
+                 host: str = '127.0.0.1', ready_timeout: float = 10.0, burners: int = 0,
+                 config_path: Optional[str] = None):
+        if kind not in SERVERS:
+            raise ValueError(f"Неизвестный сервер: {kind}")
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"Неизвестный режим: {mode}")
+
+        self.kind = kind
+        self.mode = mode
+        self.instances: List[ServerInstance] = []
+        self._burner = None
+
+        try:
+            if mode == 'thread':
+                if config_path:
+                    configure(kind, config_path)
+                for _ in range(count):
+                    self.instances.append(_start_thread(kind, host))
+                if burners:
+                    from loadgen import CpuBurner
+                    self._burner = CpuBurner(burners).start()
+            else:
+                # Процессы стартуют одновременно, ожидание готовности общее
+                processes = [_start_process(kind, host, burners, config_path) for _ in range(count)]
+                deadline = time.monotonic() + ready_timeout
+                for i, process in enumerate(processes):
+                    try:
+                        self.instances.append(_wait_ready(process, kind, host, deadline))
+                    except Exception:
+                        for rest in processes[i + 1:]:
+                            rest.kill()
+                            rest.wait()
+                            rest.stdout.close()
+                        raise
+        except Exception:
+            self.shutdown()
+            raise
+
+    @property
+    def urls(self) -> List[str]:
+        return [instance.url for instance in self.instances]
+
+    def shutdown(self):
+        if self._burner is not None:
+            self._burner.stop()
+            self._burner = None
+        for instance in self.instances:
+            instance.stop()
+        self.instances = []
+
+    def __enter__(self) -> 'ServerCluster':
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+def launch(kind: str = 'vulnerable', count: int = 1, mode: str = 'thread') -> ServerCluster:
+    return ServerCluster(kind, count, mode)
+
+
+def _serve(kind: str, host: str, port: int, burners: int = 0, config_path: Optional[str] = None):
+    """Точка входа процесса-экземпляра (mode='process')"""
+    # Баннер и ошибки серверов не должны попасть в канал готовности
+    ready_pipe = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+
+    if config_path:
+        # Ошибка в конфигурации - выход без READY, родитель получит RuntimeError
+        configure(kind, config_path)
+    server = create_server(kind, host, port)
+    if burners:
+        from loadgen import CpuBurner
+        CpuBurner(burners).start()
+
+    def ready():
+        ready_pipe.write(f"READY {server.server_address[1]}\n")
+        ready_pipe.flush()
+
+    # Сигналы как у одиночного сервера: SIGTERM дожидается запросов в работе,
+    # SIGHUP перечитывает конфигурацию
+    from control import serve
+    serve(server, handler_class(kind).RELOADER, ready=ready)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Запуск нескольких экземпляров лабораторных серверов")
+    parser.add_argument('kind', nargs='?', choices=sorted(SERVERS), default='vulnerable')
+    parser.add_argument('-n', '--count', type=int, default=1)
+    parser.add_argument('--mode', choices=('thread', 'process'), default='process')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument('--burners', type=int, default=0, help="потоки-нагрузчики CPU в процессе сервера")
+    parser.add_argument('--config', help="config.yaml для экземпляров (включает /admin/reload)")
+    parser.add_argument('--serve', choices=sorted(SERVERS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        _serve(args.serve, args.host, args.port, args.burners, args.config)
+        return
+
+    cluster = ServerCluster(args.kind, args.count, args.mode, args.host, burners=args.burners,
+                            config_path=args.config)
+    print(f" Запущено экземпляров {args.kind}: {len(cluster.instances)} ({args.mode})")
+    for url in cluster.urls:
+        print(f"  {url}")
+    print(" Для остановки: Ctrl+C")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Ctrl+C доходит и до экземпляров (общая группа процессов) - повторный
+        # сигнал не должен прервать ожидание их остановки
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        cluster.shutdown()
+        print("\n Экземпляры остановлены")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import requests
+import time
+import json
+import math
+import random
+import threading
+import concurrent.futures
+from typing import List, Dict, Optional, Tuple
+
+
+# Пары (известно-истинный, известно-ложный) ввод для сопоставимых endpoint'ов
+# обоих серверов. Условия подобраны так, чтобы проходить санитизацию
+# защищенного сервера: иначе сравнивался бы путь отказа, а не сама проверка.
+VULNERABLE_PROBES = {
+    '/check': (
+        {'condition': 'id = 1'},
+        {'condition': 'id = 99'},
+    ),
+    '/trade': (
+        {'api_key': 'API-KEY-ADMIN-123', 'symbol': 'AAPL', 'side': 'buy', 'quantity': '1'},
+        {'api_key': 'API-KEY-INVALID-000', 'symbol': 'AAPL', 'side': 'buy', 'quantity': '1'},
+    ),
+}
+
+SECURE_PROBES = {
+    '/check': (
+        {'condition': 'id = 1'},
+        {'condition': 'id = 99'},
+    ),
+    '/execute_trade': (
+        {'api_key': 'API-KEY-ADMIN-123', 'symbol': 'AAPL', 'quantity': '1'},
+        {'api_key': 'API-KEY-INVALID-000', 'symbol': 'AAPL', 'quantity': '1'},
+    ),
+}
+
+
+def ks_statistic(a: List[float], b: List[float]) -> float:
+    """Двухвыборочная статистика Колмогорова-Смирнова sup|F_a - F_b|"""
+    a = sorted(a)
+    b = sorted(b)
+    n, m = len(a), len(b)
+    if not n or not m:
+        return 0.0
+
+    i = j = 0
+    d = 0.0
+    while i < n and j < m:
+        x = min(a[i], b[j])
+        while i < n and a[i] <= x:
+            i += 1
+        while j < m and b[j] <= x:
+            j += 1
+        d = max(d, abs(i / n - j / m))
+    return d
+
+
+def ks_pvalue(d: float, n: int, m: int) -> float:
+    """Асимптотическое p-значение KS теста (распределение Колмогорова)"""
+    if d <= 0 or not n or not m:
+        return 1.0
+
+    en = math.sqrt(n * m / (n + m))
+    lam = (en + 0.12 + 0.11 / en) * d
+    total = 0.0
+    for k in range(1, 101):
+        term = 2 * (-1) ** (k - 1) * math.exp(-2 * k * k * lam * lam)
+        total += term
+        if abs(term) < 1e-12:
+            break
+    return min(max(total, 0.0), 1.0)
+
+
+def mutual_information(a: List[float], b: List[float], bins: Optional[int] = None) -> float:
+    """
+    Взаимная информация (бит) между меткой класса и временем ответа.
+    Время квантуется по квантилям объединенной выборки, поправка
+    Миллера-Мэдоу снимает положительное смещение plug-in оценки.
+    """
+    n, m = len(a), len(b)
+    total = n + m
+    if not n or not m:
+        return 0.0
+
+    if bins is None:
+        bins = max(2, min(64, int(math.sqrt(total) / 2)))
+
+    pooled = sorted(a + b)
+    edges = [pooled[int(total * k / bins)] for k in range(1, bins)]
+
+    def bucket(x):
+        lo, hi = 0, len(edges)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if x < edges[mid]:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    joint = [[0, 0] for _ in range(bins)]
+    for x in a:
+        joint[bucket(x)][0] += 1
+    for x in b:
+        joint[bucket(x)][1] += 1
+
+    p_class = (n / total, m / total)
+    mi = 0.0
+    used_cells = 0
+    used_bins = 0
+    for row in joint:
+        p_bin = (row[0] + row[1]) / total
+        if p_bin:
+            used_bins += 1
+        for c in (0, 1):
+            if row[c]:
+                used_cells += 1
+                p_joint = row[c] / total
+                mi += p_joint * math.log2(p_joint / (p_bin * p_class[c]))
+
+    correction = (used_cells - used_bins - 1) / (2 * total * math.log(2))
+    return max(mi - correction, 0.0)
+
+
+def samples_to_distinguish(d: float, alpha: float = 0.01) -> Optional[int]:
+    """Число замеров на класс, при котором KS тест отвергает H0 с уровнем alpha"""
+    if d <= 0:
+        return None
+    c_alpha = math.sqrt(-0.5 * math.log(alpha / 2))
+    return math.ceil(2 * (c_alpha / d) ** 2)
+
+
+class TimingLeakageHarness:
+
+    def __init__(self, samples: int = 500, max_workers: int = 4, timeout: float = 1):
+        self.samples = samples
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers['User-Agent'] = 'HFT-Leakage/1.0'
+            self._local.session = session
+        return session
+
+    def _probe(self, url: str, params: Dict[str, str]) -> Optional[float]:
+        try:
+            start = time.perf_counter()
+            response = self._session().get(url, params=params, timeout=self.timeout)
+            elapsed = time.perf_counter() - start
+        except Exception:
+            return None
+        return elapsed if response.status_code == 200 else None
+
+    def measure(self, url: str, true_params: Dict[str, str],
+                false_params: Dict[str, str]) -> Tuple[List[float], List[float], int]:
+        # Классы перемешиваются, чтобы дрейф и очередь на сервере
+        # распределялись между ними поровну
+        schedule = [True] * self.samples + [False] * self.samples
+        random.shuffle(schedule)
+
+        true_times, false_times = [], []
+        failed = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(self._probe, url, true_params if label else false_params)
+                for label in schedule
+            ]
+            for label, future in zip(schedule, futures):
+                elapsed = future.result()
+                if elapsed is None:
+                    failed += 1
+                elif label:
+                    true_times.append(elapsed)
+                else:
+                    false_times.append(elapsed)
+
+        return true_times, false_times, failed
+
+    def analyze(self, true_times: List[float], false_times: List[float], failed: int) -> Dict:
+        d = ks_statistic(true_times, false_times)
+        mi = mutual_information(true_times, false_times)
+        requests_spent = len(true_times) + len(false_times) + failed
+        samples_ks = samples_to_distinguish(d)
+
+        def median(values):
+            values = sorted(values)
+            return values[len(values) // 2] * 1000 if values else None
+
+        return {
+            'samples_true': len(true_times),
+            'samples_false': len(false_times),
+            'failed': failed,
+            'median_true_ms': median(true_times),
+            'median_false_ms': median(false_times),
+            'ks_statistic': d,
+            'ks_pvalue': ks_pvalue(d, len(true_times), len(false_times)),
+            'mutual_information_bits': mi,
+            'samples_to_distinguish': samples_ks,
+            # Лучший порог на одном замере при равных классах: 1/2 + D/2
+            'threshold_accuracy': 0.5 + d / 2,
+            # Один бит секрета требует ~1/I замеров; это и есть цена утечки
+            'requests_per_bit': (1 / mi) if mi > 0 else None,
+            'leaked_bits_per_request': mi,
+            'requests_spent': requests_spent,
+        }
+
+    def run_server(self, base_url: str, probes: Dict[str, Tuple[Dict, Dict]]) -> Dict[str, Dict]:
+        report = {}
+        for path, (true_params, false_params) in probes.items():
+            true_times, false_times, failed = self.measure(
+                f"{base_url}{path}", true_params, false_params
+            )
+            report[path] = self.analyze(true_times, false_times, failed)
+        return report
+
+    def run(self, vulnerable_url: Optional[str], secure_url: Optional[str]) -> Dict[str, Dict]:
+        report = {}
+        if vulnerable_url:
+            report['vulnerable'] = self.run_server(vulnerable_url, VULNERABLE_PROBES)
+        if secure_url:
+            report['secure'] = self.run_server(secure_url, SECURE_PROBES)
+        return report
+
+
+def print_report(report: Dict[str, Dict]):
+    print("=" * 100)
+    print(" ОТЧЕТ ОБ УТЕЧКЕ ЧЕРЕЗ ВРЕМЯ ОТВЕТА")
+    print("=" * 100)
+    print(f" {'Сервер':<11} {'Endpoint':<15} {'med+ мс':>8} {'med- мс':>8} "
+          f"{'KS D':>6} {'p':>8} {'MI бит':>8} {'N(KS)':>8} {'запр/бит':>9} {'запросов':>9}")
+    print("-" * 100)
+
+    for server, endpoints in report.items():
+        for path, r in endpoints.items():
+            med_true = f"{r['median_true_ms']:.3f}" if r['median_true_ms'] is not None else '-'
+            med_false = f"{r['median_false_ms']:.3f}" if r['median_false_ms'] is not None else '-'
+            n_ks = r['samples_to_distinguish'] if r['samples_to_distinguish'] else '∞'
+            per_bit = f"{r['requests_per_bit']:.1f}" if r['requests_per_bit'] else '∞'
+            print(f" {server:<11} {path:<15} {med_true:>8} {med_false:>8} "
+                  f"{r['ks_statistic']:6.3f} {r['ks_pvalue']:8.1e} "
+                  f"{r['mutual_information_bits']:8.4f} {n_ks:>8} {per_bit:>9} {r['requests_spent']:>9}")
+    print("=" * 100)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Измерение timing-утечки уязвимого и защищенного серверов")
+    parser.add_argument('--vulnerable', default="http://127.0.0.1:8888",
+                        help="URL уязвимого сервера ('' чтобы пропустить)")
+    parser.add_argument('--secure', default="http://127.0.0.1:8889",
+                        help="URL защищенного сервера ('' чтобы пропустить)")
+    parser.add_argument('--samples', type=int, default=500, help="замеров на класс")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--json', dest='json_path', help="сохранить отчет в JSON")
+    args = parser.parse_args()
+
+    harness = TimingLeakageHarness(samples=args.samples, max_workers=args.workers)
+    report = harness.run(args.vulnerable or None, args.secure or None)
+    print_report(report)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
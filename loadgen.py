@@ -0,0 +1,299 @@
+import time
+import random
+import threading
+import multiprocessing
+import statistics
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+
+# Фоновый трафик по умолчанию: endpoint -> (параметры, вес)
+BACKGROUND_TRAFFIC = {
+    'vulnerable': {
+        '/market': ({'condition': 't.balance > 0'}, 3),
+        '/trade': ({'api_key': 'API-KEY-TRADER-456', 'symbol': 'AAPL', 'side': 'buy', 'quantity': '1'}, 1),
+    },
+    'secure': {
+        '/market_data': ({'symbol': 'AAPL'}, 3),
+        '/execute_trade': ({'api_key': 'API-KEY-TRADER-456', 'symbol': 'AAPL', 'quantity': '1'}, 1),
+    },
+}
+
+# Уровни нагрузки эксперимента: фоновые запросы/с и потоки-нагрузчики CPU
+LOAD_LEVELS = [
+    {'name': 'idle', 'rate': 0, 'burners': 0},
+    {'name': 'traffic', 'rate': 200, 'burners': 0},
+    {'name': 'cpu', 'rate': 0, 'burners': 2},
+    {'name': 'traffic+cpu', 'rate': 200, 'burners': 2},
+    {'name': 'heavy', 'rate': 600, 'burners': 4},
+]
+
+
+class LoadGenerator:
+    """
+    Фоновый трафик с открытым циклом: запросы уходят по пуассоновскому
+    расписанию с темпом rate независимо от того, как быстро отвечает
+    сервер (как настоящие клиенты), endpoint выбирается по весам.
+    """
+
+    def __init__(self, base_url: str, traffic: Dict[str, Tuple[Dict, int]], rate: float = 200.0,
+                 workers: int = 8, timeout: float = 1.0):
+        self.base_url = base_url
+        self.traffic = traffic
+        self.rate = rate
+        self.workers = workers
+        self.timeout = timeout
+
+        self.sent = 0
+        self.failed = 0
+        self.latencies: Dict[str, List[float]] = {path: [] for path in traffic}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._started = 0.0
+        self._elapsed = 0.0
+
+    def start(self) -> 'LoadGenerator':
+        if self.rate <= 0:
+            return self
+        self._stop.clear()
+        self._started = time.monotonic()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"loadgen-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self) -> Dict:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._started:
+            self._elapsed = time.monotonic() - self._started
+        return self.stats()
+
+    def _worker(self):
+        session = requests.Session()
+        session.headers['User-Agent'] = 'HFT-Background/1.0'
+        paths = list(self.traffic)
+        weights = [self.traffic[p][1] for p in paths]
+        rate = self.rate / self.workers
+        next_send = time.monotonic()
+
+        while not self._stop.is_set():
+            next_send += random.expovariate(rate)
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                if self._stop.wait(delay):
+                    break
+            elif delay < -1.0:
+                # Сервер не успевает: отставание больше секунды не копится
+                next_send = time.monotonic()
+
+            path = random.choices(paths, weights)[0]
+            try:
+                start = time.perf_counter()
+                response = session.get(f"{self.base_url}{path}", params=self.traffic[path][0],
+                                       timeout=self.timeout)
+                elapsed = time.perf_counter() - start
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+
+            with self._lock:
+                self.sent += 1
+                if ok:
+                    self.latencies[path].append(elapsed)
+                else:
+                    self.failed += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            latencies = [t for values in self.latencies.values() for t in values]
+            elapsed = self._elapsed or (time.monotonic() - self._started if self._started else 0)
+            return {
+                'target_rate': self.rate,
+                'achieved_rate': self.sent / elapsed if elapsed else 0.0,
+                'sent': self.sent,
+                'failed': self.failed,
+                'median_ms': statistics.median(latencies) * 1000 if latencies else None,
+                'p99_ms': sorted(latencies)[int(len(latencies) * 0.99)] * 1000 if latencies else None,
+            }
+
+
+def _load_process(base_url: str, traffic: Dict, rate: float, workers: int, stop, results):
+    load = LoadGenerator(base_url, traffic, rate, workers).start()
+    stop.wait()
+    results.put(load.stop())
+
+
+class LoadProcess:
+    """
+    LoadGenerator в отдельном процессе: фоновые клиенты не делят GIL
+    с измеряющим клиентом, как и настоящие посторонние клиенты.
+    """
+
+    def __init__(self, base_url: str, traffic: Dict[str, Tuple[Dict, int]], rate: float = 200.0,
+                 workers: int = 8):
+        self.args = (base_url, traffic, rate, workers)
+        self.rate = rate
+        self._stop = multiprocessing.Event()
+        self._results = multiprocessing.Queue()
+        self._process = None
+
+    def start(self) -> 'LoadProcess':
+        if self.rate > 0:
+            self._process = multiprocessing.Process(
+                target=_load_process, args=self.args + (self._stop, self._results), daemon=True
+            )
+            self._process.start()
+        return self
+
+    def stop(self) -> Dict:
+        if self._process is None:
+            return LoadGenerator(*self.args).stats()
+        self._stop.set()
+        stats = self._results.get()
+        self._process.join()
+        return stats
+
+
+class CpuBurner:
+    """
+    Потоки, занимающие CPU с долей duty в каждом периоде. Запущенные в
+    процессе сервера (ServerCluster(burners=N)), они конкурируют с
+    обработчиками за GIL и ядра, как соседние задачи на загруженном хосте.
+    """
+
+    def __init__(self, threads: int = 1, duty: float = 1.0, period_s: float = 0.01):
+        self.threads = threads
+        self.duty = duty
+        self.period_s = period_s
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> 'CpuBurner':
+        self._stop.clear()
+        for i in range(self.threads):
+            thread = threading.Thread(target=self._burn, name=f"cpu-burner-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _burn(self):
+        busy = self.duty * self.period_s
+        idle = self.period_s - busy
+        while not self._stop.is_set():
+            until = time.perf_counter() + busy
+            x = 0
+            while time.perf_counter() < until:
+                x += 1
+            if idle > 0:
+                self._stop.wait(idle)
+
+
+def run_contention(kind: str = 'vulnerable', levels: Optional[List[Dict]] = None,
+                   samples: int = 300, workers: int = 4, warmup_s: float = 0.5) -> List[Dict]:
+    """
+    Для каждого уровня нагрузки: свежий экземпляр сервера в своем процессе
+    с нагрузчиками CPU внутри, фоновый трафик из отдельного процесса, затем
+    замер утечки (leakage.py) на endpoint'ах сервера. Измеряющий клиент
+    один в своем процессе - деградация относится к серверу и хосту.
+    """
+    from launcher import ServerCluster
+    from leakage import SECURE_PROBES, VULNERABLE_PROBES, TimingLeakageHarness
+
+    probes = VULNERABLE_PROBES if kind == 'vulnerable' else SECURE_PROBES
+    harness = TimingLeakageHarness(samples=samples, max_workers=workers)
+    results = []
+
+    for level in levels or LOAD_LEVELS:
+        print(f" Уровень {level['name']}: {level['rate']} запр/с фона, {level['burners']} нагрузчик(ов) CPU")
+        with ServerCluster(kind, 1, 'process', burners=level['burners']) as cluster:
+            url = cluster.urls[0]
+            load = LoadProcess(url, BACKGROUND_TRAFFIC[kind], level['rate']).start()
+            try:
+                time.sleep(warmup_s)
+                report = harness.run_server(url, probes)
+            finally:
+                background = load.stop()
+
+        results.append({'level': level, 'background': background, 'leakage': report})
+    return results
+
+
+def print_contention(results: List[Dict]):
+    print("=" * 100)
+    print(" ТОЧНОСТЬ КЛАССИФИКАЦИИ ПОД НАГРУЗКОЙ")
+    print("=" * 100)
+    print(f" {'Уровень':<12} {'фон/с':>7} {'фон p50':>8} {'Endpoint':<15} {'med+ мс':>8} {'med- мс':>8} "
+          f"{'точн.':>6} {'N(KS)':>7} {'×idle':>7}")
+    print("-" * 100)
+
+    baseline = {}
+    for result in results:
+        background = result['background']
+        for path, r in result['leakage'].items():
+            n_ks = r['samples_to_distinguish']
+            baseline.setdefault(path, n_ks)
+            ratio = f"{n_ks / baseline[path]:.1f}" if n_ks and baseline[path] else '-'
+            bg_p50 = f"{background['median_ms']:.2f}" if background['median_ms'] is not None else '-'
+            med_true = f"{r['median_true_ms']:.3f}" if r['median_true_ms'] is not None else '-'
+            med_false = f"{r['median_false_ms']:.3f}" if r['median_false_ms'] is not None else '-'
+            print(f" {result['level']['name']:<12} {background['achieved_rate']:7.0f} {bg_p50:>8} {path:<15} "
+                  f"{med_true:>8} {med_false:>8} {r['threshold_accuracy']:6.3f} "
+                  f"{n_ks if n_ks else '∞':>7} {ratio:>7}")
+    print("=" * 100)
+    print(" точн. - лучший порог на одном замере; N(KS) - замеров на класс для различения (p<0.01)")
+
+
+def main():
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Фоновая нагрузка и деградация timing-канала под ней")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help="фоновый трафик на работающий сервер (пока идет атака)")
+    run.add_argument('base_url')
+    run.add_argument('--server', choices=sorted(BACKGROUND_TRAFFIC), default='vulnerable')
+    run.add_argument('--rate', type=float, default=200.0)
+    run.add_argument('--workers', type=int, default=8)
+    run.add_argument('--seconds', type=float, default=60.0)
+
+    experiment = sub.add_parser('experiment', help="замер утечки на уровнях нагрузки из LOAD_LEVELS")
+    experiment.add_argument('--server', choices=sorted(BACKGROUND_TRAFFIC), default='vulnerable')
+    experiment.add_argument('--samples', type=int, default=300)
+    experiment.add_argument('--workers', type=int, default=4)
+    experiment.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        load = LoadGenerator(args.base_url, BACKGROUND_TRAFFIC[args.server], args.rate, args.workers).start()
+        print(f" Фоновый трафик на {args.base_url}: {args.rate} запр/с, {args.seconds} с (Ctrl+C - стоп)")
+        try:
+            time.sleep(args.seconds)
+        except KeyboardInterrupt:
+            pass
+        stats = load.stop()
+        print(f" Отправлено {stats['sent']} ({stats['achieved_rate']:.0f} запр/с), ошибок {stats['failed']}, "
+              f"p50 {stats['median_ms'] or 0:.2f} мс, p99 {stats['p99_ms'] or 0:.2f} мс")
+        return
+
+    results = run_contention(args.server, samples=args.samples, workers=args.workers)
+    print_contention(results)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
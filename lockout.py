@@ -0,0 +1,171 @@
+import math
+import time
+import threading
+from typing import Dict, Hashable, List, Optional
+
+
+class TimingWheel:
+    """
+    Хешированное колесо таймеров: срок истечения ключа попадает в ячейку
+    (тик % slots). Постановка и снятие - O(1), продвижение на тик
+    просматривает одну ячейку. Ключи со сроком дальше оборота колеса
+    остаются в ячейке до своего тика. Часы - time.monotonic(), либо
+    другие, если их текущее время передано в start.
+    """
+
+    def __init__(self, tick_s: float = 1.0, slots: int = 512, start: Optional[float] = None):
+        self.tick_s = tick_s
+        self.slots = slots
+        self._buckets: List[Dict[Hashable, int]] = [{} for _ in range(slots)]
+        self._current = self._tick(time.monotonic() if start is None else start)
+
+    def _tick(self, t: float) -> int:
+        return int(t / self.tick_s)
+
+    def schedule(self, key: Hashable, expires_at: float):
+        tick = max(math.ceil(expires_at / self.tick_s), self._current + 1)
+        self._buckets[tick % self.slots][key] = tick
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Ключи, чей тик наступил к моменту now (могут быть уже переназначены)"""
+        target = self._tick(now)
+        if target <= self._current:
+            return []
+
+        due = []
+        # Больше оборота колеса - достаточно просмотреть каждую ячейку один раз
+        start = max(self._current + 1, target - self.slots + 1)
+        for tick in range(start, target + 1):
+            bucket = self._buckets[tick % self.slots]
+            for key, key_tick in list(bucket.items()):
+                if key_tick <= target:
+                    del bucket[key]
+                    due.append(key)
+        self._current = target
+        return due
+
+
+class ExpiryTable:
+    """
+    Ключ -> значение со сроком жизни. Истечение - через колесо таймеров
+    в sweep() (фоновый поток), get() дополнительно проверяет срок сам,
+    поэтому корректность от частоты очистки не зависит. Размер ограничен
+    max_entries: при переполнении вытесняется самая старая запись.
+    """
+
+    def __init__(self, max_entries: int = 100000, tick_s: float = 1.0, slots: int = 512):
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, list] = {}
+        self._wheel = TimingWheel(tick_s, slots)
+        self._lock = threading.Lock()
+        self.evicted = 0
+        self.expired = 0
+
+    def set(self, key: Hashable, value, ttl_s: float):
+        expires_at = time.monotonic() + ttl_s
+        with self._lock:
+            if key in self._entries:
+                # Обновленная запись уходит в конец порядка вытеснения
+                del self._entries[key]
+            elif len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+                self.evicted += 1
+            self._entries[key] = [value, expires_at]
+            self._wheel.schedule(key, expires_at)
+
+    def get(self, key: Hashable, default=None):
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return default
+        return entry[0]
+
+    def remaining(self, key: Hashable) -> Optional[float]:
+        """Секунд до истечения или None, если ключа нет"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        left = entry[1] - time.monotonic()
+        return left if left > 0 else None
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return entry[0] if entry else None
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        removed = 0
+        with self._lock:
+            for key in self._wheel.advance(now):
+                entry = self._entries.get(key)
+                # Запись могла быть продлена - тогда в колесе есть более поздний тик
+                if entry is not None and entry[1] <= now:
+                    del self._entries[key]
+                    removed += 1
+            self.expired += removed
+        return removed
+
+    def keys(self) -> List[Hashable]:
+        now = time.monotonic()
+        with self._lock:
+            return [key for key, (_, expires_at) in self._entries.items() if expires_at > now]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class LockoutTracker:
+    """
+    Счетчики неудачных попыток и блокировки в памяти (без записи в БД).
+    После max_failures неудач за window_s ключ блокируется на lock_s.
+    """
+
+    def __init__(self, max_failures: int, window_s: float, lock_s: float,
+                 max_entries: int = 100000, tick_s: float = 1.0):
+        self.max_failures = max_failures
+        self.window_s = window_s
+        self.lock_s = lock_s
+        self.failures = ExpiryTable(max_entries, tick_s)
+        self.locks = ExpiryTable(max_entries, tick_s)
+        self._lock = threading.Lock()
+
+    def is_locked(self, key: Hashable) -> bool:
+        return key in self.locks
+
+    def record_failure(self, key: Hashable) -> bool:
+        """Учесть неудачу; True - ключ только что заблокирован"""
+        with self._lock:
+            count = self.failures.get(key, 0) + 1
+            if count < self.max_failures:
+                self.failures.set(key, count, self.window_s)
+                return False
+            self.failures.pop(key)
+            self.locks.set(key, count, self.lock_s)
+            return True
+
+    def record_success(self, key: Hashable):
+        self.failures.pop(key)
+
+    def sweep(self) -> int:
+        return self.failures.sweep() + self.locks.sweep()
+
+
+class ExpirySweeper(threading.Thread):
+    """Фоновая очистка таблиц с периодом interval_s"""
+
+    def __init__(self, tables: List, interval_s: float = 1.0):
+        super().__init__(name='expiry-sweeper', daemon=True)
+        self.tables = tables
+        self.interval_s = interval_s
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_s):
+            for table in self.tables:
+                table.sweep()
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,155 @@
+import json
+import time
+import secrets
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+
+class Subscription:
+    """
+    Подписка одного клиента: ограниченный буфер готовых сообщений.
+    Переполнение - вытесняется самое старое сообщение (для котировок важна
+    свежая цена), клиенту отправляется число пропущенных тиков. Подписчик,
+    отстающий дольше max_lag тиков подряд, отключается.
+    """
+
+    def __init__(self, symbols: Iterable[str], buffer_size: int = 256, max_lag: int = 1024):
+        self.symbols = frozenset(symbols)
+        self.max_lag = max_lag
+        self.dropped = 0
+        self.lagging = 0
+        self.overrun = False
+        self.closed = False
+        self._buffer = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+
+    def push(self, message: bytes):
+        with self._cond:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+                self.lagging += 1
+                if self.lagging > self.max_lag:
+                    self.overrun = True
+                    self.closed = True
+            else:
+                self.lagging = 0
+            self._buffer.append(message)
+            self._cond.notify()
+
+    def drain(self, timeout: float) -> List[bytes]:
+        """Все накопленные сообщения (одна запись в сокет на пачку)"""
+        with self._cond:
+            if not self._buffer and not self.closed:
+                self._cond.wait(timeout)
+            messages = list(self._buffer)
+            self._buffer.clear()
+            self.lagging = 0
+            return messages
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+
+class MarketFeed:
+    """
+    Общий источник котировок: один поток раз в interval_s генерирует тик
+    для каждого символа, на который кто-то подписан, сериализует его
+    в событие SSE один раз и раздает готовые байты всем подписчикам.
+    Стоимость тика не зависит от того, как часто клиенты читают.
+    """
+
+    def __init__(self, interval_s: float = 0.01, buffer_size: int = 256,
+                 max_lag: int = 1024, max_subscribers: int = 50):
+        self.interval_s = interval_s
+        self.buffer_size = buffer_size
+        self.max_lag = max_lag
+        self.max_subscribers = max_subscribers
+
+        self.ticks = 0
+        self.evicted = 0
+        self.closed = False
+        self._prices: Dict[str, float] = {}
+        self._subscribers: List[Subscription] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self, symbols: Iterable[str]) -> Optional[Subscription]:
+        """Новая подписка или None, если достигнут max_subscribers или поток закрыт"""
+        subscription = Subscription(symbols, self.buffer_size, self.max_lag)
+        with self._lock:
+            if self.closed or len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.append(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='market-feed', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.close()
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def close(self):
+        """Завершить все подписки (остановка сервера), новые не принимаются"""
+        with self._lock:
+            self.closed = True
+            subscribers, self._subscribers = self._subscribers, []
+        for subscription in subscribers:
+            subscription.close()
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _tick(self, symbol: str, seq: int) -> bytes:
+        price = self._prices.get(symbol, 150.25)
+        # Случайное блуждание с шагом до ±5 центов
+        price = max(round(price + (secrets.randbelow(11) - 5) / 100, 2), 0.01)
+        self._prices[symbol] = price
+        data = json.dumps({
+            'symbol': symbol,
+            'price': price,
+            'volume': secrets.randbelow(1000000),
+            'timestamp_ns': time.time_ns(),
+            'seq': seq
+        })
+        return f"event: tick\ndata: {data}\n\n".encode()
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while True:
+            with self._lock:
+                subscribers = list(self._subscribers)
+                if not subscribers:
+                    # Под блокировкой: subscribe() после этого снова взведет событие
+                    self._wakeup.clear()
+            if not subscribers:
+                # Без подписчиков производитель спит до первой подписки
+                self._wakeup.wait()
+                next_tick = time.monotonic()
+                continue
+
+            self.ticks += 1
+            symbols = set().union(*(s.symbols for s in subscribers))
+            messages = {symbol: self._tick(symbol, self.ticks) for symbol in symbols}
+
+            for subscription in subscribers:
+                for symbol in subscription.symbols:
+                    subscription.push(messages[symbol])
+                if subscription.overrun:
+                    self.evicted += 1
+                    self.unsubscribe(subscription)
+
+            next_tick += self.interval_s
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Производитель не успевает - тики не накапливаются
+                next_tick = time.monotonic()
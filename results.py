@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import threading
+from array import array
+from typing import Dict, Optional
+
+from oracles import CALIBRATION_CONDITIONS
+
+
+# Колонки замеров: имя -> typecode array (совпадает с dtype numpy при чтении)
+SAMPLE_COLUMNS = {
+    'probe': 'q',        # id решения (0 - замер вне решения: калибровка, пачка длин)
+    'ts_ns': 'q',        # time.time_ns() отправки
+    'endpoint': 'b',     # индекс в ENDPOINTS
+    'cls': 'b',          # индекс в CLASSES
+    'rtt': 'd',          # с; NaN - запрос потерян
+    'server_time': 'd',  # с, время из тела ответа; NaN - неизвестно
+    'truth': 'b',        # condition_was_true из ответа: 1/0, -1 - неизвестно
+}
+
+# Колонки решений test_condition
+DECISION_COLUMNS = {
+    'probe': 'q',
+    'cls': 'b',
+    'decision': 'b',
+    'confidence': 'd',
+}
+
+ENDPOINTS = ('other', '/check', '/market', '/trade', '/check_batch')
+CLASSES = ('other', 'calibration', 'length', 'char', 'exploit')
+
+NAN = float('nan')
+
+_CALIBRATION = frozenset(c for pair in CALIBRATION_CONDITIONS.values() for c in pair)
+
+
+def condition_class(condition: str) -> int:
+    """Класс условия по его тексту (для разреза статистики)"""
+    if condition in _CALIBRATION:
+        return CLASSES.index('calibration')
+    if condition.startswith('LENGTH('):
+        return CLASSES.index('length')
+    if 'UNICODE(' in condition or 'SUBSTR(' in condition:
+        return CLASSES.index('char')
+    if 'SLEEP' in condition.upper() or 'BENCHMARK' in condition.upper():
+        return CLASSES.index('exploit')
+    return CLASSES.index('other')
+
+
+def endpoint_index(path: str) -> int:
+    return ENDPOINTS.index(path) if path in ENDPOINTS else 0
+
+
+class ProbeStore:
+    """
+    Колоночное хранилище замеров атаки: каталог с бинарными файлами
+    <part>.<колонка>.bin, по одному на колонку. Запись пачками по
+    batch_size строк, файлы открыты на дозапись. part - pid процесса,
+    поэтому воркеры parallel_extract пишут в тот же каталог без блокировок
+    между процессами. analysis.load читает все части через numpy.
+    """
+
+    def __init__(self, path: str, batch_size: int = 4096):
+        self.path = path
+        self.batch_size = batch_size
+        os.makedirs(path, exist_ok=True)
+
+        schema = os.path.join(path, 'schema.json')
+        if not os.path.exists(schema):
+            with open(schema, 'w') as f:
+                json.dump({
+                    'samples': SAMPLE_COLUMNS,
+                    'decisions': DECISION_COLUMNS,
+                    'endpoints': ENDPOINTS,
+                    'classes': CLASSES,
+                }, f, indent=2)
+
+        self.part = str(os.getpid())
+        self._samples = {name: array(code) for name, code in SAMPLE_COLUMNS.items()}
+        self._decisions = {name: array(code) for name, code in DECISION_COLUMNS.items()}
+        self._files: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._next_probe = 1
+        self.rows = 0
+
+    def begin_probe(self, condition: str) -> int:
+        """Начать решение: замеры этого потока до end_probe относятся к нему"""
+        with self._lock:
+            probe = self._next_probe
+            self._next_probe += 1
+        self._local.probe = probe
+        return probe
+
+    def end_probe(self, condition: str, decision: bool, confidence: float):
+        probe = getattr(self._local, 'probe', 0)
+        self._local.probe = 0
+        with self._lock:
+            columns = self._decisions
+            columns['probe'].append(probe)
+            columns['cls'].append(condition_class(condition))
+            columns['decision'].append(1 if decision else 0)
+            columns['confidence'].append(confidence)
+
+    def record(self, path: str, condition: str, rtt: Optional[float],
+               server_time: Optional[float] = None, truth: Optional[bool] = None):
+        ts_ns = time.time_ns()
+        with self._lock:
+            columns = self._samples
+            columns['probe'].append(getattr(self._local, 'probe', 0))
+            columns['ts_ns'].append(ts_ns)
+            columns['endpoint'].append(endpoint_index(path))
+            columns['cls'].append(condition_class(condition))
+            columns['rtt'].append(NAN if rtt is None else rtt)
+            columns['server_time'].append(NAN if server_time is None else server_time)
+            columns['truth'].append(-1 if truth is None else (1 if truth else 0))
+            self.rows += 1
+            due = len(columns['probe']) >= self.batch_size
+        if due:
+            self.flush()
+
+    def _write(self, table: str, columns: Dict[str, array]):
+        for name, values in columns.items():
+            key = f"{table}.{name}"
+            f = self._files.get(key)
+            if f is None:
+                f = self._files[key] = open(os.path.join(self.path, f"{self.part}.{key}.bin"), 'ab')
+            values.tofile(f)
+            f.flush()
+            del values[:]
+
+    def flush(self):
+        with self._lock:
+            self._write('samples', self._samples)
+            self._write('decisions', self._decisions)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
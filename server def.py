@@ -1,20 +1,36 @@
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import parse_qs, urlparse
 import sqlite3
 import time
 import json
 import re
 import hashlib
+import hmac
 import secrets
+import sys
 import threading
 import statistics
+from collections import deque
 from typing import Optional, Tuple
 import urllib.parse
 
+from control import DEFAULT_CONFIG, ConfigReloader, config_path_from_argv, merge_config, print_reload, serve
+from instrumentation import PhaseTimer, PhaseMetrics, RequestMetrics
+from ipstate import ADMITTED, BLACKLISTED, RATE_LIMITED, IPStateTable
+from lockout import ExpirySweeper, LockoutTracker
+from marketfeed import MarketFeed
+from profiling import profiled, profiler_from_argv
+
 class HFTSecureSQLiServer(BaseHTTPRequestHandler):
     
     SECRET_PASSWORD = "SecureTrader321!"
     
+    API_KEYS = {
+        'admin': 'API-KEY-ADMIN-123',
+        'trader1': 'API-KEY-TRADER-456',
+        'trader2': 'API-KEY-TRADER-789',
+    }
+    
     
     SECURITY_CONFIG = {
         
@@ -23,6 +39,8 @@ class HFTSecureSQLiServer(BaseHTTPRequestHandler):
        
         'rate_limit_per_ip': 10000,
         'connection_limit': 100,
+        'connection_queue_timeout_ms': 0,  # 0 - сразу 503 сверх лимита
+        'idle_timeout_s': 5,
         'param_max_length': 50,
         'max_password_length': 256,
        
@@ -36,17 +54,91 @@ class HFTSecureSQLiServer(BaseHTTPRequestHandler):
         'enable_rate_limiting': True,
         'log_suspicious_activity': True,
         'block_malicious_ips': True,
-        'max_consecutive_failures': 3
+        'max_consecutive_failures': 3,
+        'attack_burst_per_second': 100,  # событий журнала атак с одного IP - в черный список
+        
+        # Состояние по IP (лимит частоты, черный список, история)
+        'ip_state_shards': 64,
+        'ip_state_idle_s': 60,
+        
+        # Блокировка учетных записей и IP после неудачных попыток (в памяти)
+        'max_failed_attempts': 3,
+        'account_lock_minutes': 15,
+        'ip_failed_attempts': 1000,  # неудач /login и /execute_trade с одного IP за окно
+        'failure_window_s': 60,
+        'blacklist_seconds': 300,
+        'lockout_table_size': 100000,
+        
+        # Поток котировок /market_stream (SSE)
+        'stream_tick_ms': 10,
+        'stream_buffer_ticks': 256,  # буфер подписчика, сверх - вытесняются старые тики
+        'stream_max_lag_ticks': 1024,  # столько вытеснений подряд - подписчик отключается
+        'stream_max_subscribers': 50,  # не больше половины connection_limit
+        'stream_max_symbols': 20,
+        
+        # Server-Timing раскрывает время фаз клиенту - только для отладки
+        'expose_server_timing': False
     }
     
    
-    _rate_limiter = {}
     _connection_counter = 0
     _connection_lock = threading.Lock()
-    _attack_log = []
+    _attack_log = deque(maxlen=10000)
     _attack_log_lock = threading.Lock()
-    _ip_blacklist = {}
-    _request_history = {}
+    # Лимит частоты, черный список и история запросов - одна запись на IP
+    _ip_state = IPStateTable(
+        SECURITY_CONFIG['ip_state_shards'],
+        SECURITY_CONFIG['lockout_table_size'],
+        SECURITY_CONFIG['ip_state_idle_s']
+    )
+    
+    _account_lockout = LockoutTracker(
+        SECURITY_CONFIG['max_failed_attempts'],
+        SECURITY_CONFIG['account_lock_minutes'] * 60,
+        SECURITY_CONFIG['account_lock_minutes'] * 60,
+        SECURITY_CONFIG['lockout_table_size']
+    )
+    _ip_failures = LockoutTracker(
+        SECURITY_CONFIG['ip_failed_attempts'],
+        SECURITY_CONFIG['failure_window_s'],
+        SECURITY_CONFIG['blacklist_seconds'],
+        SECURITY_CONFIG['lockout_table_size']
+    )
+    _sweeper = None
+    _credentials = None
+    _api_keys = None
+    # Ключ HMAC для API-ключей: новый на каждый процесс, наружу не выходит
+    _api_key_secret = secrets.token_bytes(32)
+    _market_feed = MarketFeed(
+        SECURITY_CONFIG['stream_tick_ms'] / 1000,
+        SECURITY_CONFIG['stream_buffer_ticks'],
+        SECURITY_CONFIG['stream_max_lag_ticks'],
+        SECURITY_CONFIG['stream_max_subscribers']
+    )
+    # Хеш и соль для неизвестного пользователя: проверка стоит столько же
+    _UNKNOWN_USER = ('0' * 128, '0' * 64)
+    _UNKNOWN_API_KEY = (bytes(32), None)
+    
+    ENDPOINTS = [
+        '/info', '/check', '/login', '/market_data', '/market_stream', '/execute_trade',
+        '/security_log', '/test_secure', '/metrics', '/admin/reload'
+    ]
+    _phase_metrics = PhaseMetrics(ENDPOINTS)
+    _request_metrics = RequestMetrics(ENDPOINTS)
+    
+    # Профиль по endpoint'ам (--profile), см. profiling.py
+    PROFILER = None
+    
+    # Перечитывание config.yaml (SIGHUP, /admin/reload), раздел secure_server.security.
+    # Ключи с другим именем или единицами: ключ config.yaml -> (ключ SECURITY_CONFIG, множитель)
+    RELOADER = None
+    CONFIG_RENAMES = {
+        'min_response_time_ms': ('min_response_time_ns', 1000000),
+        'max_response_time_ms': ('max_response_time_ns', 1000000),
+        'max_query_time_ms': ('query_timeout_ms', 1),
+    }
+    # Размеры структур, созданных при старте, меняются только перезапуском
+    RESTART_REQUIRED = ('connection_limit', 'lockout_table_size', 'ip_state_shards')
     
     def init_db(self):
        
@@ -81,23 +173,18 @@ class HFTSecureSQLiServer(BaseHTTPRequestHandler):
             )
         ''')
         
-       
-        def hash_password(password, salt=None):
-            if salt is None:
-                salt = secrets.token_hex(32)
-            return hashlib.sha512((password + salt).encode()).hexdigest(), salt
-        
+        hash_password = self.hash_password
         
         pass_hash, pass_salt = hash_password(self.SECRET_PASSWORD)
-        api_hash, api_salt = hash_password('API-KEY-ADMIN-123')
+        api_key_hash = lambda username: self.hash_api_key(self.API_KEYS[username]).hex()
         
         traders = [
-            (1, 'admin', pass_hash, pass_salt, api_hash, 
+            (1, 'admin', pass_hash, pass_salt, api_key_hash('admin'), 
              1000000.0, 1500, time.time(), 0, None),
             (2, 'trader1', *hash_password('Pass123!'), 
-             *hash_password('API-KEY-TRADER-456'), 500000.0, 800, time.time(), 0, None),
+             api_key_hash('trader1'), 500000.0, 800, time.time(), 0, None),
             (3, 'trader2', *hash_password('SecurePass!'), 
-             *hash_password('API-KEY-TRADER-789'), 750000.0, 1200, time.time(), 0, None)
+             api_key_hash('trader2'), 750000.0, 1200, time.time(), 0, None)
         ]
         
         cursor.executemany('''
@@ -108,6 +195,134 @@ class HFTSecureSQLiServer(BaseHTTPRequestHandler):
         conn.commit()
         return conn
     
+    @staticmethod
+    def hash_password(password, salt=None):
+        if salt is None:
+            salt = secrets.token_hex(32)
+        return hashlib.sha512((password + salt).encode()).hexdigest(), salt
+    
+    @classmethod
+    def credentials(cls):
+        """username -> (hash, salt), вычисляется один раз на процесс"""
+        if cls._credentials is None:
+            with cls._connection_lock:
+                if cls._credentials is None:
+                    cls._credentials = {
+                        username: cls.hash_password(password)
+                        for username, password in (
+                            ('admin', cls.SECRET_PASSWORD),
+                            ('trader1', 'Pass123!'),
+                            ('trader2', 'SecurePass!'),
+                        )
+                    }
+        return cls._credentials
+    
+    @classmethod
+    def hash_api_key(cls, api_key):
+        return hmac.new(cls._api_key_secret, api_key.encode(), hashlib.sha256).digest()
+    
+    @classmethod
+    def api_keys(cls):
+        """HMAC(API-ключ) -> (HMAC, трейдер), строится при старте сервера"""
+        if cls._api_keys is None:
+            with cls._connection_lock:
+                if cls._api_keys is None:
+                    digests = {username: cls.hash_api_key(key) for username, key in cls.API_KEYS.items()}
+                    cls._api_keys = {digest: (digest, username) for username, digest in digests.items()}
+        return cls._api_keys
+    
+    @classmethod
+    def apply_config(cls, doc, startup=False):
+        """
+        Новый SECURITY_CONFIG из config.yaml: проверяется целиком и заменяет
+        прежний одним присваиванием. Счетчики блокировок, таблица IP и поток котировок
+        получают новые параметры на месте, накопленное состояние остается.
+        startup=True - до создания сервера: применяются и RESTART_REQUIRED
+        с secret_password, структуры по ним строятся заново.
+        """
+        section = doc.get('secure_server') or {}
+        config, report = merge_config(cls.SECURITY_CONFIG, section.get('security') or {},
+                                      cls.CONFIG_RENAMES, () if startup else cls.RESTART_REQUIRED)
+        if config['min_response_time_ns'] > config['max_response_time_ns']:
+            raise ValueError("min_response_time больше max_response_time")
+        if config['random_time_jitter'] and config['jitter_range_ns'] < 1:
+            raise ValueError("jitter_range_ns должен быть положительным")
+        for key in cls.RESTART_REQUIRED:
+            if config[key] < 1:
+                raise ValueError(f"{key} должен быть положительным")
+        password = section.get('secret_password', cls.SECRET_PASSWORD)
+        if password != cls.SECRET_PASSWORD:
+            if not startup:
+                report['restart_required'].append('secret_password')
+            elif not isinstance(password, str):
+                raise ValueError(f"secret_password: ожидалась строка, получено {password!r}")
+            else:
+                report['applied']['secret_password'] = '***'
+        
+        with cls._connection_lock:
+            if startup:
+                if password != cls.SECRET_PASSWORD:
+                    cls.SECRET_PASSWORD = password
+                    cls._credentials = None
+                if any(key in report['applied'] for key in ('lockout_table_size', 'ip_state_shards')):
+                    cls._build_tables(config)
+            cls.SECURITY_CONFIG = config
+            cls.timeout = config['idle_timeout_s']
+            cls._ip_state.idle_s = config['ip_state_idle_s']
+            
+            lockout = cls._account_lockout
+            lockout.max_failures = config['max_failed_attempts']
+            lockout.window_s = lockout.lock_s = config['account_lock_minutes'] * 60
+            
+            failures = cls._ip_failures
+            failures.max_failures = config['ip_failed_attempts']
+            failures.window_s = config['failure_window_s']
+            failures.lock_s = config['blacklist_seconds']
+            
+            feed = cls._market_feed
+            feed.interval_s = config['stream_tick_ms'] / 1000
+            feed.buffer_size = config['stream_buffer_ticks']
+            feed.max_lag = config['stream_max_lag_ticks']
+            feed.max_subscribers = config['stream_max_subscribers']
+        return report
+    
+    @classmethod
+    def _build_tables(cls, config):
+        """Таблицы состояния заново под новые размеры (только при старте, под _connection_lock)"""
+        cls._ip_state = IPStateTable(
+            config['ip_state_shards'], config['lockout_table_size'], config['ip_state_idle_s']
+        )
+        cls._account_lockout = LockoutTracker(
+            config['max_failed_attempts'], config['account_lock_minutes'] * 60,
+            config['account_lock_minutes'] * 60, config['lockout_table_size']
+        )
+        cls._ip_failures = LockoutTracker(
+            config['ip_failed_attempts'], config['failure_window_s'],
+            config['blacklist_seconds'], config['lockout_table_size']
+        )
+        if cls._sweeper is not None:
+            cls._sweeper.tables = [cls._ip_state, cls._account_lockout, cls._ip_failures]
+    
+    @classmethod
+    def start_sweeper(cls):
+        """Фоновая очистка истекших блокировок (один поток на процесс)"""
+        with cls._connection_lock:
+            if cls._sweeper is None:
+                cls._sweeper = ExpirySweeper([
+                    cls._ip_state, cls._account_lockout, cls._ip_failures
+                ])
+                cls._sweeper.start()
+    
+    def _record_failure(self, account=None):
+        """Неудачная попытка: счетчики в памяти, без записи в БД"""
+        client_ip = self.client_address[0]
+        if account is not None and self._account_lockout.record_failure(account):
+            self._request_metrics.inc('account_lockouts')
+            self._log_attack(f"HFT Account locked: {account}")
+        if self._ip_failures.record_failure(client_ip):
+            self._ip_state.block(client_ip, self.SECURITY_CONFIG['blacklist_seconds'])
+            self._log_attack(f"HFT Too many failed attempts: {client_ip}")
+    
     def _normalize_response_time(self, start_time_ns):
        
         if not self.SECURITY_CONFIG['normalize_response_time']:
@@ -126,42 +341,16 @@ class HFTSecureSQLiServer(BaseHTTPRequestHandler):
             if sleep_time > 0:
                 time.sleep(sleep_time)
     
-    def _check_rate_limit(self, client_ip):
-       
-        if not self.SECURITY_CONFIG['enable_rate_limiting']:
-            return True
-        
-        current_time = time.time()
-        
-        if client_ip not in self._rate_limiter:
-            self._rate_limiter[client_ip] = []
-        
-      
-        self._rate_limiter[client_ip] = [
-            t for t in self._rate_limiter[client_ip] 
-            if current_time - t < 1
-        ]
-        
-        if len(self._rate_limiter[client_ip]) >= self.SECURITY_CONFIG['rate_limit_per_ip']:
+    def _admit(self, client_ip):
+        """Черный список и лимит частоты за один захват блокировки части"""
+        status = self._ip_state.admit(
+            client_ip,
+            self.SECURITY_CONFIG['rate_limit_per_ip'] if self.SECURITY_CONFIG['enable_rate_limiting'] else None,
+            self.SECURITY_CONFIG['block_malicious_ips']
+        )
+        if status == RATE_LIMITED:
             self._log_attack(f"HFT Rate limit exceeded: {client_ip}")
-            return False
-        
-        self._rate_limiter[client_ip].append(current_time)
-        return True
-    
-    def _check_blacklist(self, client_ip):
-       
-        if not self.SECURITY_CONFIG['block_malicious_ips']:
-            return True
-        
-        if client_ip in self._ip_blacklist:
-            block_until = self._ip_blacklist[client_ip]
-            if time.time() < block_until:
-                return False
-            else:
-                del self._ip_blacklist[client_ip]
-        
-        return True
+        return status
     
     def _sanitize_hft_input(self, input_str):
        
@@ -238,19 +427,12 @@ class HFTSecureSQLiServer(BaseHTTPRequestHandler):
                 'message': message,
                 'path': self.path
             }
+            # deque(maxlen) сам отбрасывает старые записи
             self._attack_log.append(log_entry)
-            
-           
-            if len(self._attack_log) > 10000:
-                self._attack_log = self._attack_log[-10000:]
-            
-          
-            recent_attacks = [e for e in self._attack_log 
-                            if time.time_ns() - e['timestamp'] < 1e9]  # 1 секунда
-            
-            if len(recent_attacks) > 100:
-               
-                self._ip_blacklist[client_ip] = time.time() + 300  # 5 минут
+        
+        # Всплеск считается по IP в его записи, без просмотра журнала
+        if self._ip_state.record_attack(client_ip, self.SECURITY_CONFIG['attack_burst_per_second']):
+            self._ip_state.block(client_ip, self.SECURITY_CONFIG['blacklist_seconds'])
     
     def _constant_time_compare(self, val1, val2):
        
@@ -258,30 +440,52 @@ class HFTSecureSQLiServer(BaseHTTPRequestHandler):
             return val1 == val2
         
         
-        if len(val1) != len(val2):
-            return False
+        # Сравнение в C за время, зависящее только от длины
+        return hmac.compare_digest(val1, val2)
+    
+    # Таймаут сокета: простаивающее соединение закрывается, не занимая поток
+    timeout = SECURITY_CONFIG['idle_timeout_s']
+    
+    def send_response(self, code, message=None):
+        # Код ответа для /metrics (включая send_error)
+        self.status_code = code
+        super().send_response(code, message)
+    
+    def do_GET(self):
         
-        result = 0
-        for x, y in zip(val1, val2):
-            result |= ord(x) ^ ord(y)
+        self.timer = PhaseTimer()
+        self.status_code = None
+        # Весь запрос видит одну версию конфигурации, даже если ее перечитали
+        self.SECURITY_CONFIG = type(self).SECURITY_CONFIG
         
-        return result == 0
+        path = urlparse(self.path).path
+        
+        try:
+            with profiled(self.PROFILER, self._phase_metrics.label(path)):
+                self.handle_get()
+        finally:
+            self._phase_metrics.observe(path, self.timer)
+            self._request_metrics.observe(path, self.status_code, self.timer.total_ns())
     
-    def do_GET(self):
+    def handle_get(self):
        
-        start_time_ns = time.perf_counter_ns()
+        start_time_ns = self.timer.start_ns
         client_ip = self.client_address[0]
         
         
-        if not self._check_blacklist(client_ip):
+        admission = self._admit(client_ip)
+        if admission == BLACKLISTED:
+            self._request_metrics.inc('blacklist_rejections')
             self.send_error(429, "IP blocked - Suspicious activity detected")
             return
         
-       
-        if not self._check_rate_limit(client_ip):
+        if admission != ADMITTED:
+            self._request_metrics.inc('rate_limit_rejections')
             self.send_error(429, "Rate limit exceeded")
             return
         
+        self.timer.mark('admission')
+        
         try:
             parsed = urlparse(self.path)
             
@@ -311,6 +515,7 @@ class HFTSecureSQLiServer(BaseHTTPRequestHandler):
                 if condition:
                     # Безопасная обработка условия
                     safe_condition = self._sanitize_hft_input(condition)
+                    self.timer.mark('sanitize')
                     if not safe_condition:
                         self.send_hft_json({
                             'error': 'Invalid or malicious condition',
@@ -329,10 +534,41 @@ class HFTSecureSQLiServer(BaseHTTPRequestHandler):
                 else:
                     self.send_error(400, 'No condition provided')
             
+            elif parsed.path == '/login':
+                params = parse_qs(parsed.query)
+                username = self._sanitize_hft_input(params.get('username', [''])[0])
+                password = params.get('password', [''])[0]
+                self.timer.mark('sanitize')
+                
+                if not username or not password or len(password) > self.SECURITY_CONFIG['max_password_length']:
+                    self.send_hft_json({'authenticated': False, 'error': 'Missing parameters'})
+                    return
+                
+                # Хеш считается всегда - и для неизвестного, и для заблокированного
+                # пользователя, чтобы время ответа не раскрывало исход
+                credentials = self.credentials()
+                stored_hash, salt = credentials.get(username, self._UNKNOWN_USER)
+                input_hash, _ = self.hash_password(password, salt)
+                verified = self._constant_time_compare(stored_hash, input_hash) and username in credentials
+                locked = self._account_lockout.is_locked(username)
+                self.timer.mark('verify')
+                
+                if verified and not locked:
+                    self._account_lockout.record_success(username)
+                    self.send_hft_json({'authenticated': True, 'username': username})
+                else:
+                    # Попытки во время блокировки ее не продлевают, но считаются для IP
+                    self._record_failure(None if locked else username)
+                    self.send_hft_json({
+                        'authenticated': False,
+                        'error': 'Account temporarily locked' if locked else 'Invalid credentials'
+                    })
+            
             elif parsed.path == '/market_data':
                
                 params = parse_qs(parsed.query)
                 symbol = self._sanitize_hft_input(params.get('symbol', ['AAPL'])[0])
+                self.timer.mark('sanitize')
                 
                 
                 market_data = {
@@ -345,41 +581,55 @@ class HFTSecureSQLiServer(BaseHTTPRequestHandler):
                 
                 self.send_hft_json(market_data)
             
+            elif parsed.path == '/market_stream':
+                params = parse_qs(parsed.query)
+                raw_symbols = params.get('symbols', ['AAPL'])[0].split(',')
+                symbols = {self._sanitize_hft_input(s.strip().upper()) for s in raw_symbols}
+                symbols.discard(None)
+                self.timer.mark('sanitize')
+                
+                if not symbols or len(symbols) > self.SECURITY_CONFIG['stream_max_symbols']:
+                    self.send_error(400, 'Invalid symbols')
+                    return
+                
+                limit = params.get('limit', ['0'])[0]
+                self.stream_market_data(symbols, int(limit) if limit.isdigit() else 0)
+            
             elif parsed.path == '/execute_trade':
              
                 params = parse_qs(parsed.query)
                 api_key = self._sanitize_hft_input(params.get('api_key', [''])[0])
                 symbol = self._sanitize_hft_input(params.get('symbol', [''])[0])
                 quantity = self._sanitize_hft_input(params.get('quantity', ['0'])[0])
+                self.timer.mark('sanitize')
                 
                 if not all([api_key, symbol, quantity]):
                     self.send_hft_json({'error': 'Missing parameters'})
                     return
                 
-               
-                query = "SELECT api_key_hash FROM traders WHERE username = ?"
-                success, result = self._execute_secure_hft_query(query, ('admin',))
+                # Один HMAC и один поиск в словаре, без запроса к БД. Сравнение
+                # выполняется и для неизвестного ключа - время не раскрывает исход
+                input_hash = self.hash_api_key(api_key)
+                stored_hash, trader = self.api_keys().get(input_hash, self._UNKNOWN_API_KEY)
+                verified = self._constant_time_compare(stored_hash, input_hash) and trader is not None
+                self.timer.mark('verify')
                 
-                if success and result:
-                    stored_hash = result[0][0]
-                    input_hash = hashlib.sha512(api_key.encode()).hexdigest()
-                    
-                    if self._constant_time_compare(stored_hash, input_hash):
-                        # Успешная авторизация
-                        trade_result = {
-                            'executed': True,
-                            'trade_id': secrets.randbelow(1000000),
-                            'symbol': symbol,
-                            'quantity': quantity,
-                            'price': 150.25,
-                            'timestamp_ns': time.time_ns(),
-                            'execution_time_ns': secrets.randbelow(200000) + 100000
-                        }
-                        self.send_hft_json(trade_result)
-                    else:
-                        self.send_hft_json({'executed': False, 'error': 'Invalid API key'})
+                if verified:
+                    # Успешная авторизация
+                    trade_result = {
+                        'executed': True,
+                        'trade_id': secrets.randbelow(1000000),
+                        'trader': trader,
+                        'symbol': symbol,
+                        'quantity': quantity,
+                        'price': 150.25,
+                        'timestamp_ns': time.time_ns(),
+                        'execution_time_ns': secrets.randbelow(200000) + 100000
+                    }
+                    self.send_hft_json(trade_result)
                 else:
-                    self.send_hft_json({'executed': False, 'error': 'Authentication failed'})
+                    self._record_failure()
+                    self.send_hft_json({'executed': False, 'error': 'Invalid API key'})
             
             elif parsed.path == '/security_log':
                 # Только для localhost
@@ -390,11 +640,24 @@ class HFTSecureSQLiServer(BaseHTTPRequestHandler):
                 with self._attack_log_lock:
                     self.send_hft_json({
                         'attack_count': len(self._attack_log),
-                        'recent_attacks': self._attack_log[-100:],
-                        'blacklisted_ips': list(self._ip_blacklist.keys()),
-                        'current_connections': self._connection_counter
+                        'recent_attacks': list(self._attack_log)[-100:],
+                        'blacklisted_ips': self._ip_state.blocked(),
+                        'client_state': self._ip_state.get(client_ip),
+                        'locked_accounts': self._account_lockout.locks.keys(),
+                        'current_connections': self._connection_counter,
+                        'connection_limit': self.SECURITY_CONFIG['connection_limit'],
+                        'rejected_connections': getattr(self.server, 'rejected_connections', 0)
                     })
             
+            elif parsed.path == '/admin/reload':
+                # Только для localhost
+                if client_ip != '127.0.0.1':
+                    self.send_error(403, "Forbidden")
+                elif self.RELOADER is None:
+                    self.send_error(404, "Config reload is not enabled")
+                else:
+                    self.send_hft_json(self.RELOADER.reload())
+            
             elif parsed.path == '/test_secure':
                
                 test_data = {
@@ -406,6 +669,31 @@ class HFTSecureSQLiServer(BaseHTTPRequestHandler):
                 }
                 self.send_hft_json(test_data)
             
+            elif parsed.path == '/metrics':
+                # Только для localhost
+                if client_ip != '127.0.0.1':
+                    self.send_error(403, "Forbidden")
+                    return
+                
+                gauges = {
+                    'blacklist_size': ('IP в черном списке', len(self._ip_state.blocked())),
+                    'tracked_ips': ('IP с состоянием в памяти', len(self._ip_state)),
+                    'locked_accounts': ('Заблокированные учетные записи', len(self._account_lockout.locks)),
+                    'failure_counters': ('Счетчики неудачных попыток',
+                                         len(self._account_lockout.failures) + len(self._ip_failures.failures)),
+                    'active_connections': ('Открытые соединения', self._connection_counter),
+                    'attack_log_size': ('Записей в журнале атак', len(self._attack_log)),
+                    'stream_subscribers': ('Подписчики /market_stream', self._market_feed.subscriber_count()),
+                    'stream_evictions': ('Отключенные отстающие подписчики', self._market_feed.evicted),
+                }
+                self.send_hft_text(
+                    self._request_metrics.render(
+                        events=('rate_limit_rejections', 'blacklist_rejections', 'connection_rejections',
+                                'account_lockouts', 'stream_rejections'),
+                        gauges=gauges
+                    ) + self._phase_metrics.render()
+                )
+            
             else:
                 self.send_error(404)
                 
@@ -414,9 +702,64 @@ class HFTSecureSQLiServer(BaseHTTPRequestHandler):
             self.send_error(500, "Internal server error")
         finally:
             self._normalize_response_time(start_time_ns)
+            self.timer.mark('normalize')
+    
+    def stream_market_data(self, symbols, limit=0):
+        """
+        Server-Sent Events из общего MarketFeed. Ответ HTTP/1.0 без
+        Content-Length: поток идет до отключения клиента, вытеснения
+        отстающего подписчика или limit тиков (0 - без ограничения).
+        Медленный клиент упирается в таймаут сокета idle_timeout_s.
+        """
+        subscription = self._market_feed.subscribe(symbols)
+        # Поток закрывает drain() своего сервера, а не общий MarketFeed
+        track = getattr(self.server, 'track_stream', None)
+        if subscription is not None and track is not None and not track(subscription):
+            self._market_feed.unsubscribe(subscription)
+            subscription = None
+        if subscription is None:
+            self._request_metrics.inc('stream_rejections')
+            self.send_error(503, 'Too many stream subscribers')
+            return
+        
+        sent = 0
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate')
+            self.send_header('X-HFT-Security', 'Enabled')
+            self.send_header('X-Content-Type-Options', 'nosniff')
+            self.end_headers()
+            self.timer.mark('handler')
+            
+            reported_drops = 0
+            while not subscription.closed and (not limit or sent < limit):
+                messages = subscription.drain(timeout=1.0)
+                if limit:
+                    messages = messages[:limit - sent]
+                sent += len(messages)
+                
+                chunk = b''.join(messages)
+                if subscription.dropped > reported_drops:
+                    # Клиент узнает, сколько тиков пропущено из-за отставания
+                    chunk += f"event: lag\ndata: {subscription.dropped - reported_drops}\n\n".encode()
+                    reported_drops = subscription.dropped
+                self.wfile.write(chunk or b": keepalive\n\n")
+        except OSError:
+            # Клиент отключился или не читал дольше таймаута сокета
+            pass
+        finally:
+            self._market_feed.unsubscribe(subscription)
+            if track is not None:
+                self.server.untrack_stream(subscription)
+            self.timer.mark('stream')
     
     def send_hft_json(self, data):
         """Отправка JSON с заголовками безопасности для HFT"""
+        self.timer.mark('handler')
+        body = json.dumps(data, indent=2).encode()
+        self.timer.mark('json_encode')
+        
         self.send_response(200)
         self.send_header('Content-Type', 'application/json')
         self.send_header('X-HFT-Security', 'Enabled')
@@ -424,36 +767,165 @@ class HFTSecureSQLiServer(BaseHTTPRequestHandler):
         self.send_header('X-Frame-Options', 'DENY')
         self.send_header('X-XSS-Protection', '1; mode=block')
         self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate')
+        if self.SECURITY_CONFIG['expose_server_timing']:
+            self.send_header('Server-Timing', self.timer.server_timing())
         self.end_headers()
-        self.wfile.write(json.dumps(data, indent=2).encode())
+        self.wfile.write(body)
+        self.timer.mark('write')
+    
+    def send_hft_text(self, text):
+        """Отправка text/plain для экспозиции метрик"""
+        body = text.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Content-Type-Options', 'nosniff')
+        self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate')
+        self.end_headers()
+        self.wfile.write(body)
     
     def log_message(self, format, *args):
         """Минимальное логирование для HFT"""
         pass
 
-def run_hft_secure_server(port=8889):
-    import socket
+class HFTSecureHTTPServer(ThreadingHTTPServer):
+    """
+    Многопоточный сервер с контролем допуска соединений: сверх
+    connection_limit соединение ждет не дольше connection_queue_timeout_ms,
+    затем получает 503 без запуска обработчика и без нового потока.
+    """
+    
+    daemon_threads = True
+    request_queue_size = 128
+    
+    REJECT_RESPONSE = (
+        b"HTTP/1.0 503 Service Unavailable\r\n"
+        b"Content-Length: 0\r\n"
+        b"Retry-After: 1\r\n"
+        b"Connection: close\r\n\r\n"
+    )
+    
+    def __init__(self, server_address, handler_class=HFTSecureSQLiServer):
+        super().__init__(server_address, handler_class)
+        config = handler_class.SECURITY_CONFIG
+        self.handler_class = handler_class
+        self._slots = threading.BoundedSemaphore(config['connection_limit'])
+        self.rejected_connections = 0
+        # Соединения и подписки этого экземпляра: класс обработчика и
+        # MarketFeed общие для всех экземпляров процесса (mode='thread')
+        self.active_connections = 0
+        self._streams = set()
+        self._draining = False
+        self._state_lock = threading.Lock()
+        handler_class.start_sweeper()
+        handler_class.api_keys()
     
-    def check_port(port):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    @property
+    def queue_timeout(self) -> float:
+        # Читается на каждом соединении: перечитанный config.yaml действует сразу
+        return self.handler_class.SECURITY_CONFIG['connection_queue_timeout_ms'] / 1000
+    
+    def process_request(self, request, client_address):
+        if self.queue_timeout > 0:
+            admitted = self._slots.acquire(timeout=self.queue_timeout)
+        else:
+            admitted = self._slots.acquire(blocking=False)
+        
+        if not admitted:
+            self._reject(request)
+            return
+        
+        with self.handler_class._connection_lock:
+            self.handler_class._connection_counter += 1
+        with self._state_lock:
+            self.active_connections += 1
+        
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self._release()
+            raise
+    
+    def process_request_thread(self, request, client_address):
         try:
-            sock.bind(('127.0.0.1', port))
-            sock.close()
+            super().process_request_thread(request, client_address)
+        finally:
+            self._release()
+    
+    def _release(self):
+        with self.handler_class._connection_lock:
+            self.handler_class._connection_counter -= 1
+        with self._state_lock:
+            self.active_connections -= 1
+        self._slots.release()
+    
+    def track_stream(self, subscription) -> bool:
+        """Учесть подписку этого сервера; False - сервер уже останавливается"""
+        with self._state_lock:
+            if self._draining:
+                return False
+            self._streams.add(subscription)
             return True
-        except:
-            return False
     
-    if not check_port(port):
-        print(f"  Порт {port} занят! Пробую порт {port + 1}")
-        port += 1
+    def untrack_stream(self, subscription):
+        with self._state_lock:
+            self._streams.discard(subscription)
     
+    def drain(self, timeout_s):
+        """
+        После shutdown(): закрыть потоки котировок этого сервера и ждать,
+        пока завершатся его принятые соединения (не дольше timeout_s).
+        Другие экземпляры процесса продолжают работать. True - все завершены.
+        """
+        with self._state_lock:
+            self._draining = True
+            streams = list(self._streams)
+        for subscription in streams:
+            subscription.close()
+        deadline = time.monotonic() + timeout_s
+        while self.active_connections > 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.active_connections == 0
+    
+    def _reject(self, request):
+        self.rejected_connections += 1
+        self.handler_class._request_metrics.inc('connection_rejections')
+        try:
+            request.setblocking(False)
+            try:
+                # Вычитываем запрос, чтобы close не превратился в RST до ответа
+                request.recv(65536)
+            except OSError:
+                pass
+            request.setblocking(True)
+            request.sendall(self.REJECT_RESPONSE)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+
+def run_hft_secure_server(port=8889, config_path=None):
     try:
-        server = HTTPServer(('127.0.0.1', port), HFTSecureSQLiServer)
+        reloader = ConfigReloader(config_path or DEFAULT_CONFIG, HFTSecureSQLiServer.apply_config)
+        HFTSecureSQLiServer.RELOADER = reloader
+        if config_path:
+            print_reload(reloader.reload(startup=True))
+        
+        # Занятость порта проверяет сам bind; если порт занят - порт выбирает ОС
+        try:
+            server = HFTSecureHTTPServer(('127.0.0.1', port))
+        except OSError:
+            print(f"  Порт {port} занят! Использую свободный порт, выбранный ОС")
+            server = HFTSecureHTTPServer(('127.0.0.1', 0))
+        port = server.server_address[1]
         
         print("="*80)
         print("  HFT ЗАЩИЩЕННЫЙ ОТ TIMING-BASED SQL INJECTION")
         print("="*80)
         print(f" Адрес: http://127.0.0.1:{port}")
+        if HFTSecureSQLiServer.PROFILER is not None:
+            print(f" Профилирование: {type(HFTSecureSQLiServer.PROFILER).__name__} → "
+                  f"{HFTSecureSQLiServer.PROFILER.out_dir}/")
         
         print("\n  МЕХАНИЗМЫ ЗАЩИТЫ ДЛЯ HFT:")
         print("  1. Constant-time операции (постоянное время выполнения)")
@@ -464,7 +936,11 @@ def run_hft_secure_server(port=8889):
         print("  6. Рейт-лимитирование (10,000 запросов/секунду)")
         print("  7. Черный список IP при обнаружении атак")
         print("  8. Мониторинг аномальной активности")
+        print(f"  9. Лимит соединений ({HFTSecureSQLiServer.SECURITY_CONFIG['connection_limit']}, сверх лимита - 503)")
+        print(f" 10. Блокировка учетной записи после {HFTSecureSQLiServer.SECURITY_CONFIG['max_failed_attempts']} неудачных входов")
         print("\n ЗАЩИЩЕННЫЕ HFT ENDPOINTS:")
+        print("  GET /market_stream?symbols=AAPL,MSFT - поток котировок (SSE)")
+        print(f"  GET /admin/reload - перечитать {reloader.path} (localhost; также SIGHUP)")
 
         print("\nВСЕ TIMING АТАКИ БЛОКИРОВАНЫ")
         print("   • SLEEP/BENCHMARK атаки не работают")
@@ -474,7 +950,8 @@ def run_hft_secure_server(port=8889):
         print("\n HFT сервер запущен. Для остановки: Ctrl+C")
         print("="*80)
         
-        server.serve_forever()
+        serve(server, reloader)
+        print("\n\n🛑 HFT сервер остановлен")
         
     except KeyboardInterrupt:
         print("\n\n🛑 HFT сервер остановлен")
@@ -482,4 +959,5 @@ def run_hft_secure_server(port=8889):
         print(f"\n❌ Ошибка: {e}")
 
 if __name__ == "__main__":
-    run_hft_secure_server()
+    HFTSecureSQLiServer.PROFILER = profiler_from_argv(sys.argv[1:], 'secure')
+    run_hft_secure_server(config_path=config_path_from_argv(sys.argv[1:]))
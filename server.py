@@ -6,18 +6,63 @@ import json
 import sys
 import threading
 
+from control import DEFAULT_CONFIG, ConfigReloader, config_path_from_argv, merge_config, print_reload, serve
+from instrumentation import PhaseTimer, PhaseMetrics, RequestMetrics, ShardedCounter
+from profiling import profiled, profiler_from_argv
+
 class HFTVulnerableSQLiServer(BaseHTTPRequestHandler):
     
     SECRET_PASSWORD = "TraderPass123!"
     
+    # Задержка при выполненном условии и успешной сделке (timing-уязвимость)
+    SUCCESS_DELAY_S = 0.001
+    
     # Глобальные структуры для имитации HFT окружения
     _market_data_cache = {}
     _cache_lock = threading.Lock()
-    _trading_volume = 0
+    _trading_volume = ShardedCounter()
+    
+    # Быстрый путь /trade: поиск трейдера по api_key в словаре, построенном
+    # один раз, без init_db и SQL (и без SQL injection). По умолчанию выключен,
+    # чтобы лабораторная уязвимость оставалась на месте.
+    TRADE_FAST_PATH = False
+    _api_key_index = None
+    
+    # Наблюдаемость: фазы запроса на /metrics; заголовок Server-Timing -
+    # только по expose_server_timing в config.yaml: фаза delay в нем
+    # появляется лишь при истинном условии и выдает ответ без всякого тайминга
+    EXPOSE_SERVER_TIMING = False
+    ENDPOINTS = ['/info', '/check', '/check_batch', '/market', '/trade', '/login', '/metrics', '/admin/reload']
+    _phase_metrics = PhaseMetrics(ENDPOINTS)
+    _request_metrics = RequestMetrics(ENDPOINTS)
+    
+    # profiling.RequestProfiler/SamplingProfiler: профиль по endpoint'ам (--profile)
+    PROFILER = None
+    
+    # Перечитывание config.yaml (SIGHUP, /admin/reload): ключ раздела
+    # vulnerable_server -> атрибут класса, меняющийся без перезапуска
+    RELOADER = None
+    RELOADABLE = {
+        'sleep_delay': 'SUCCESS_DELAY_S',
+        'trade_fast_path': 'TRADE_FAST_PATH',
+        'expose_server_timing': 'EXPOSE_SERVER_TIMING',
+    }
+    
+    # /check_batch: все условия пакета выполняются на одной общей БД,
+    # созданной один раз (без init_db на каждое условие)
+    MAX_BATCH_CONDITIONS = 10000
+    MAX_BATCH_BODY = 4 * 1024 * 1024
+    _shared_db = None
+    _shared_db_lock = threading.Lock()
     
     def init_db(self):
         """Инициализация БД для HFT"""
-        conn = sqlite3.connect(':memory:')
+        return self.create_db()
+    
+    @classmethod
+    def create_db(cls, check_same_thread=True):
+        """Новая in-memory БД с таблицами и данными трейдеров"""
+        conn = sqlite3.connect(':memory:', check_same_thread=check_same_thread)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -44,16 +89,57 @@ class HFTVulnerableSQLiServer(BaseHTTPRequestHandler):
             )
         ''')
         
-        # Данные для HFT
-        traders = [
-            (1, 'admin', self.SECRET_PASSWORD, 'API-KEY-ADMIN-123', 1000000.0, 1500, time.time()),
+        cursor.executemany('INSERT INTO traders VALUES (?,?,?,?,?,?,?)', cls.trader_rows())
+        conn.commit()
+        return conn
+    
+    @classmethod
+    def apply_config(cls, doc, startup=False):
+        """
+        Раздел vulnerable_server из config.yaml. secret_password - только
+        при старте (startup=True, до создания сервера), на ходу - перезапуск.
+        """
+        current = {key: getattr(cls, attr) for key, attr in cls.RELOADABLE.items()}
+        current['secret_password'] = cls.SECRET_PASSWORD
+        _, report = merge_config(current, doc.get('vulnerable_server') or {},
+                                 restart_required=() if startup else ('secret_password',))
+        # Ключи независимы: запрос в работе увидит каждый либо старым, либо новым
+        for key, value in report['applied'].items():
+            if key == 'secret_password':
+                cls.SECRET_PASSWORD = value
+                cls._shared_db = None
+            else:
+                setattr(cls, cls.RELOADABLE[key], value)
+        return report
+    
+    @classmethod
+    def shared_db(cls):
+        """Общая БД для /check_batch (доступ под _shared_db_lock)"""
+        if cls._shared_db is None:
+            with cls._cache_lock:
+                if cls._shared_db is None:
+                    cls._shared_db = cls.create_db(check_same_thread=False)
+        return cls._shared_db
+    
+    @classmethod
+    def trader_rows(cls):
+        """Данные для HFT"""
+        return [
+            (1, 'admin', cls.SECRET_PASSWORD, 'API-KEY-ADMIN-123', 1000000.0, 1500, time.time()),
             (2, 'trader1', 'Pass123!', 'API-KEY-TRADER-456', 500000.0, 800, time.time()),
             (3, 'trader2', 'SecurePass!', 'API-KEY-TRADER-789', 750000.0, 1200, time.time())
         ]
-        
-        cursor.executemany('INSERT INTO traders VALUES (?,?,?,?,?,?,?)', traders)
-        conn.commit()
-        return conn
+    
+    @classmethod
+    def api_key_index(cls):
+        """Хеш-индекс api_key -> строка трейдера (те же условия, что в SQL /trade)"""
+        if cls._api_key_index is None:
+            with cls._cache_lock:
+                if cls._api_key_index is None:
+                    cls._api_key_index = {
+                        row[3]: row for row in cls.trader_rows() if row[4] > 0
+                    }
+        return cls._api_key_index
     
     def execute_conditional_query(self, condition):
         """
@@ -62,6 +148,7 @@ class HFTVulnerableSQLiServer(BaseHTTPRequestHandler):
         """
         conn = self.init_db()
         cursor = conn.cursor()
+        self.timer.mark('init_db')
         
         start_time = time.perf_counter()
         
@@ -70,28 +157,12 @@ class HFTVulnerableSQLiServer(BaseHTTPRequestHandler):
             query = f"SELECT COUNT(*) FROM traders WHERE {condition}"
             cursor.execute(query)
             result = cursor.fetchone()[0]
+            self.timer.mark('query')
             
             # Timing-based уязвимость для HFT
             if result > 0:
-                # Используем разные методы задержки для демонстрации
-                if "SLEEP" in condition.upper():
-                    # Извлекаем параметр SLEEP
-                    import re
-                    sleep_match = re.search(r'SLEEP\s*\(\s*(\d+\.?\d*)\s*\)', condition, re.IGNORECASE)
-                    if sleep_match:
-                        sleep_time = float(sleep_match.group(1))
-                        time.sleep(sleep_time)
-                elif "BENCHMARK" in condition.upper():
-                    # Эмулируем BENCHMARK нагрузку
-                    benchmark_match = re.search(r'BENCHMARK\s*\(\s*(\d+)\s*,\s*', condition, re.IGNORECASE)
-                    if benchmark_match:
-                        iterations = int(benchmark_match.group(1))
-                        # Имитация нагрузки
-                        for _ in range(min(iterations, 10000)):
-                            _ = hashlib.md5(str(time.time()).encode()).hexdigest()
-                else:
-                    # Стандартная задержка для HFT (1 мс)
-                    time.sleep(0.001)
+                self.apply_condition_delay(condition)
+                self.timer.mark('delay')
             
             elapsed = time.perf_counter() - start_time
             
@@ -114,6 +185,28 @@ class HFTVulnerableSQLiServer(BaseHTTPRequestHandler):
         finally:
             conn.close()
     
+    def apply_condition_delay(self, condition):
+        """Задержка для выполненного условия (SLEEP/BENCHMARK или 1 мс)"""
+        # Используем разные методы задержки для демонстрации
+        if "SLEEP" in condition.upper():
+            # Извлекаем параметр SLEEP
+            import re
+            sleep_match = re.search(r'SLEEP\s*\(\s*(\d+\.?\d*)\s*\)', condition, re.IGNORECASE)
+            if sleep_match:
+                sleep_time = float(sleep_match.group(1))
+                time.sleep(sleep_time)
+        elif "BENCHMARK" in condition.upper():
+            # Эмулируем BENCHMARK нагрузку
+            benchmark_match = re.search(r'BENCHMARK\s*\(\s*(\d+)\s*,\s*', condition, re.IGNORECASE)
+            if benchmark_match:
+                iterations = int(benchmark_match.group(1))
+                # Имитация нагрузки
+                for _ in range(min(iterations, 10000)):
+                    _ = hashlib.md5(str(time.time()).encode()).hexdigest()
+        else:
+            # Стандартная задержка для HFT (SUCCESS_DELAY_S, 1 мс)
+            time.sleep(self.SUCCESS_DELAY_S)
+    
     def check_market_condition(self, condition):
         """
         Метод для проверки рыночных условий с timing уязвимостью
@@ -121,6 +214,7 @@ class HFTVulnerableSQLiServer(BaseHTTPRequestHandler):
         """
         conn = self.init_db()
         cursor = conn.cursor()
+        self.timer.mark('init_db')
         
         start_time = time.perf_counter()
         
@@ -134,10 +228,12 @@ class HFTVulnerableSQLiServer(BaseHTTPRequestHandler):
             """
             cursor.execute(query)
             result = cursor.fetchone()[0]
+            self.timer.mark('query')
             
             # Задержка при выполнении условия
             if result > 0:
-                time.sleep(0.001)  # 1 мс задержка
+                time.sleep(self.SUCCESS_DELAY_S)
+                self.timer.mark('delay')
             
             elapsed = time.perf_counter() - start_time
             
@@ -155,8 +251,165 @@ class HFTVulnerableSQLiServer(BaseHTTPRequestHandler):
     
     def do_GET(self):
         """Обработка GET запросов для HFT"""
+        self.timer = PhaseTimer()
+        self.status_code = None
         parsed = urlparse(self.path)
         
+        try:
+            with profiled(self.PROFILER, self._phase_metrics.label(parsed.path)):
+                self.handle_get(parsed)
+        finally:
+            self._phase_metrics.observe(parsed.path, self.timer)
+            self._request_metrics.observe(parsed.path, self.status_code, self.timer.total_ns())
+    
+    def do_POST(self):
+        """Обработка POST запросов (пакетные проверки)"""
+        self.timer = PhaseTimer()
+        self.status_code = None
+        parsed = urlparse(self.path)
+        
+        try:
+            with profiled(self.PROFILER, self._phase_metrics.label(parsed.path)):
+                if parsed.path == '/check_batch':
+                    self.handle_check_batch()
+                else:
+                    self.send_error(404)
+        finally:
+            self._phase_metrics.observe(parsed.path, self.timer)
+            self._request_metrics.observe(parsed.path, self.status_code, self.timer.total_ns())
+    
+    def read_batch_conditions(self):
+        """
+        Условия из тела запроса: JSON (список строк или {"conditions": [...]})
+        либо по одному условию на строку. None - ответ с ошибкой уже отправлен.
+        """
+        length = self.headers.get('Content-Length')
+        if length is None:
+            self.send_error(411, 'Content-Length required')
+            return None
+        try:
+            length = int(length)
+        except ValueError:
+            self.send_error(400, 'Invalid Content-Length')
+            return None
+        if length > self.MAX_BATCH_BODY:
+            self.send_error(413, 'Batch body too large')
+            return None
+        
+        body = self.rfile.read(length).decode('utf-8', errors='replace')
+        self.timer.mark('read_body')
+        
+        content_type = self.headers.get('Content-Type', '')
+        if 'json' in content_type:
+            try:
+                data = json.loads(body)
+            except ValueError as e:
+                self.send_error(400, f'Invalid JSON: {e}')
+                return None
+            if isinstance(data, dict):
+                data = data.get('conditions')
+            if not isinstance(data, list) or not all(isinstance(c, str) for c in data):
+                self.send_error(400, 'Expected a list of condition strings')
+                return None
+            conditions = [c for c in data if c.strip()]
+        else:
+            conditions = [line for line in body.splitlines() if line.strip()]
+        self.timer.mark('parse')
+        
+        if not conditions:
+            self.send_error(400, 'No conditions provided')
+            return None
+        if len(conditions) > self.MAX_BATCH_CONDITIONS:
+            self.send_error(413, f'At most {self.MAX_BATCH_CONDITIONS} conditions per batch')
+            return None
+        return conditions
+    
+    def evaluate_condition(self, cursor, condition):
+        """Условие на общей БД: результат и время запроса с задержкой"""
+        start_time = time.perf_counter()
+        try:
+            # УЯЗВИМЫЙ КОД - тот же SQL, что и в /check
+            cursor.execute(f"SELECT COUNT(*) FROM traders WHERE {condition}")
+            result = cursor.fetchone()[0]
+            query_time = time.perf_counter() - start_time
+            if result > 0:
+                self.apply_condition_delay(condition)
+            return {
+                'success': True,
+                'time': time.perf_counter() - start_time,
+                'query_time': query_time,
+                'result': result,
+                'condition_was_true': result > 0
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'time': time.perf_counter() - start_time,
+                'error': str(e)
+            }
+    
+    def handle_check_batch(self):
+        """
+        POST /check_batch: потоковый ответ в формате NDJSON.
+        Первая строка - накладные расходы (чтение и разбор тела, стоимость
+        init_db для сравнения с /check), затем по строке на условие по мере
+        выполнения, последняя - итог. Ответ HTTP/1.0 без Content-Length:
+        конец потока - закрытие соединения.
+        """
+        conditions = self.read_batch_conditions()
+        if conditions is None:
+            return
+        
+        # Стоимость init_db, которую платит каждый запрос /check
+        self.init_db().close()
+        self.timer.mark('init_db')
+        
+        db = self.shared_db()
+        self.timer.mark('shared_db')
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('X-HFT-Server', 'Vulnerable')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        if self.EXPOSE_SERVER_TIMING:
+            self.send_header('Server-Timing', self.timer.server_timing())
+        self.end_headers()
+        
+        phases = dict(self.timer.phases)
+        overhead = {
+            'type': 'batch',
+            'conditions': len(conditions),
+            'read_body_ms': phases['read_body'] / 1e6,
+            'parse_ms': phases['parse'] / 1e6,
+            'init_db_ms': phases['init_db'] / 1e6
+        }
+        self.wfile.write(json.dumps(overhead).encode() + b'\n')
+        self.timer.mark('handler')
+        
+        eval_time = 0.0
+        true_count = 0
+        with self._shared_db_lock:
+            cursor = db.cursor()
+            for index, condition in enumerate(conditions):
+                result = self.evaluate_condition(cursor, condition)
+                eval_time += result['time']
+                true_count += bool(result.get('condition_was_true'))
+                result['index'] = index
+                result['condition'] = condition
+                self.wfile.write(json.dumps(result).encode() + b'\n')
+        self.timer.mark('evaluate')
+        
+        self.wfile.write(json.dumps({
+            'type': 'summary',
+            'conditions': len(conditions),
+            'true': true_count,
+            'eval_ms': eval_time * 1000,
+            'total_ms': self.timer.total_ns() / 1e6
+        }).encode() + b'\n')
+        self.timer.mark('write')
+    
+    def handle_get(self, parsed):
+        """Маршрутизация GET запросов"""
         if parsed.path == '/info':
             self.send_json({
                 'server': 'HFT УЯЗВИМЫЙ Timing SQL Injection Server',
@@ -210,6 +463,15 @@ class HFTVulnerableSQLiServer(BaseHTTPRequestHandler):
             side = params.get('side', [''])[0]
             quantity = params.get('quantity', ['0'])[0]
             
+            if self.TRADE_FAST_PATH:
+                trader = self.api_key_index().get(api_key)
+                self.timer.mark('index_lookup')
+                try:
+                    self.send_trade_result(trader, symbol, side, quantity)
+                except Exception as e:
+                    self.send_json({'error': str(e)})
+                return
+            
             # УЯЗВИМЫЙ КОД для HFT
             query = f"""
                 SELECT * FROM traders 
@@ -219,29 +481,14 @@ class HFTVulnerableSQLiServer(BaseHTTPRequestHandler):
             
             conn = self.init_db()
             cursor = conn.cursor()
+            self.timer.mark('init_db')
             
             try:
                 cursor.execute(query)
                 trader = cursor.fetchone()
+                self.timer.mark('query')
                 
-                if trader:
-                    # Timing уязвимость: задержка при успешной авторизации
-                    time.sleep(0.001)
-                    
-                    with self._cache_lock:
-                        self._trading_volume += int(quantity)
-                    
-                    self.send_json({
-                        'trade_executed': True,
-                        'trader_id': trader[0],
-                        'symbol': symbol,
-                        'side': side,
-                        'quantity': quantity,
-                        'timestamp': time.time(),
-                        'total_volume': self._trading_volume
-                    })
-                else:
-                    self.send_json({'trade_executed': False, 'error': 'Invalid API key'})
+                self.send_trade_result(trader, symbol, side, quantity)
                     
             except Exception as e:
                 self.send_json({'error': str(e), 'query': query})
@@ -256,6 +503,7 @@ class HFTVulnerableSQLiServer(BaseHTTPRequestHandler):
             
             conn = self.init_db()
             cursor = conn.cursor()
+            self.timer.mark('init_db')
             
             # УЯЗВИМЫЙ КОД - конкатенация строк!
             query = f"SELECT * FROM traders WHERE username='{username}' AND password='{password}'"
@@ -265,6 +513,7 @@ class HFTVulnerableSQLiServer(BaseHTTPRequestHandler):
                 cursor.execute(query)
                 trader = cursor.fetchone()
                 elapsed = time.perf_counter() - start
+                self.timer.mark('query')
                 
                 self.send_json({
                     'authenticated': trader is not None,
@@ -280,48 +529,102 @@ class HFTVulnerableSQLiServer(BaseHTTPRequestHandler):
             finally:
                 conn.close()
         
+        elif parsed.path == '/metrics':
+            """Счетчики запросов и гистограммы фаз в формате Prometheus"""
+            self.send_text(self._request_metrics.render() + self._phase_metrics.render())
+        
+        elif parsed.path == '/admin/reload':
+            """Перечитать config.yaml без перезапуска (только localhost)"""
+            if self.client_address[0] != '127.0.0.1':
+                self.send_error(403, "Forbidden")
+            elif self.RELOADER is None:
+                self.send_error(404, "Config reload is not enabled")
+            else:
+                self.send_json(self.RELOADER.reload())
+        
         else:
             self.send_error(404)
     
+    def send_trade_result(self, trader, symbol, side, quantity):
+        """Ответ /trade для найденного (или не найденного) трейдера"""
+        if trader:
+            # Timing уязвимость: задержка при успешной авторизации
+            time.sleep(self.SUCCESS_DELAY_S)
+            self.timer.mark('delay')
+            
+            self._trading_volume.add(int(quantity))
+            
+            self.send_json({
+                'trade_executed': True,
+                'trader_id': trader[0],
+                'symbol': symbol,
+                'side': side,
+                'quantity': quantity,
+                'timestamp': time.time(),
+                'total_volume': self._trading_volume.value()
+            })
+        else:
+            self.send_json({'trade_executed': False, 'error': 'Invalid API key'})
+    
+    def send_response(self, code, message=None):
+        # Запоминаем код ответа для /metrics (включая send_error)
+        self.status_code = code
+        super().send_response(code, message)
+    
     def send_json(self, data):
         """Отправка JSON с заголовками для HFT"""
+        self.timer.mark('handler')
+        body = json.dumps(data, indent=2).encode()
+        self.timer.mark('json_encode')
+        
         self.send_response(200)
         self.send_header('Content-Type', 'application/json')
         self.send_header('X-HFT-Server', 'Vulnerable')
         self.send_header('Access-Control-Allow-Origin', '*')
+        if self.EXPOSE_SERVER_TIMING:
+            self.send_header('Server-Timing', self.timer.server_timing())
+        self.end_headers()
+        self.wfile.write(body)
+        self.timer.mark('write')
+    
+    def send_text(self, text):
+        """Отправка text/plain (экспозиция метрик)"""
+        body = text.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write(json.dumps(data, indent=2).encode())
+        self.wfile.write(body)
     
     def log_message(self, format, *args):
         """Минимальное логирование для HFT"""
         pass
 
-def run_hft_vulnerable_server(port=8888):
+def run_hft_vulnerable_server(port=8888, config_path=None):
     """Запуск уязвимого HFT сервера"""
-    import socket
-    
-    def check_port(port):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        try:
-            sock.bind(('127.0.0.1', port))
-            sock.close()
-            return True
-        except:
-            return False
-    
-    if not check_port(port):
-        print(f"⚠️  Порт {port} занят! Пробую порт {port + 1}")
-        port += 1
-    
     try:
-        server = HTTPServer(('127.0.0.1', port), HFTVulnerableSQLiServer)
+        reloader = ConfigReloader(config_path or DEFAULT_CONFIG, HFTVulnerableSQLiServer.apply_config)
+        HFTVulnerableSQLiServer.RELOADER = reloader
+        if config_path:
+            print_reload(reloader.reload(startup=True))
+        
+        # Занятость порта проверяет сам bind; если порт занят - порт выбирает ОС
+        try:
+            server = HTTPServer(('127.0.0.1', port), HFTVulnerableSQLiServer)
+        except OSError:
+            print(f"⚠️  Порт {port} занят! Использую свободный порт, выбранный ОС")
+            server = HTTPServer(('127.0.0.1', 0), HFTVulnerableSQLiServer)
+        port = server.server_address[1]
         
         print("="*80)
         print("⚡ HFT УЯЗВИМЫЙ SQL INJECTION СЕРВЕР (TIMING-BASED)")
         print("="*80)
         print(f"📍 Адрес: http://127.0.0.1:{port}")
         print(f"🔓 Пароль трейдера: '{HFTVulnerableSQLiServer.SECRET_PASSWORD}'")
-        print(f"⏱️  Задержка при успехе: 1 мс")
+        print(f"⏱️  Задержка при успехе: {HFTVulnerableSQLiServer.SUCCESS_DELAY_S * 1000:g} мс")
+        if HFTVulnerableSQLiServer.PROFILER is not None:
+            print(f"🔬 Профилирование: {type(HFTVulnerableSQLiServer.PROFILER).__name__} → "
+                  f"{HFTVulnerableSQLiServer.PROFILER.out_dir}/")
         
         print("\n🎯 УЯЗВИМОСТИ ДЛЯ HFT:")
         print("  1. Time-based SQL Injection через SLEEP/BENCHMARK")
@@ -332,9 +635,12 @@ def run_hft_vulnerable_server(port=8888):
         print("\n📡 HFT ENDPOINTS:")
         print("  GET /info - информация о сервере")
         print("  GET /check?condition=SQL - timing проверка")
+        print("  POST /check_batch - пакет условий (JSON или построчно), потоковый ответ")
         print("  GET /market?condition=SQL - рыночные условия")
         print("  GET /trade?api_key=X&symbol=Y - выполнение сделки")
         print("  GET /login?username=X&password=Y - авторизация")
+        print("  GET /metrics - метрики запросов и фаз (Prometheus)")
+        print(f"  GET /admin/reload - перечитать {reloader.path} (localhost; также SIGHUP)")
         
         print("\n💀 ПРИМЕРЫ АТАК:")
         print("  /check?condition=1=1 AND SLEEP(0.01)")
@@ -344,7 +650,8 @@ def run_hft_vulnerable_server(port=8888):
         print("\n🚀 Сервер запущен. Для остановки: Ctrl+C")
         print("="*80)
         
-        server.serve_forever()
+        serve(server, reloader)
+        print("\n\n🛑 HFT сервер остановлен")
         
     except KeyboardInterrupt:
         print("\n\n🛑 HFT сервер остановлен")
@@ -352,4 +659,5 @@ def run_hft_vulnerable_server(port=8888):
         print(f"\n❌ Ошибка: {e}")
 
 if __name__ == "__main__":
-    run_hft_vulnerable_server()
\ No newline at end of file
+    HFTVulnerableSQLiServer.PROFILER = profiler_from_argv(sys.argv[1:], 'vulnerable')
+    run_hft_vulnerable_server(config_path=config_path_from_argv(sys.argv[1:]))
\ No newline at end of file
@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import tempfile
+import itertools
+import threading
+import concurrent.futures
+from typing import Dict, List, Optional
+
+
+# Сетка по умолчанию: ключ SECURITY_CONFIG -> значения
+DEFAULT_GRID = {
+    'min_response_time_ns': [0, 100000, 250000, 500000],
+    'jitter_range_ns': [1, 50000, 200000],
+    'rate_limit_per_ip': [10000],
+}
+
+# Эталонная нагрузка для пропускной способности: дешевый endpoint без БД
+BENCHMARK_ENDPOINT = ('/market_data', 'symbol', 'AAPL')
+
+
+def parse_value(text: str):
+    if text.lower() in ('true', 'false'):
+        return text.lower() == 'true'
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def parse_grid(specs: List[str]) -> Dict[str, list]:
+    """
+    ['ключ=v1,v2', ...] -> сетка; ключи должны быть в SECURITY_CONFIG.
+    Ключи RESTART_REQUIRED допустимы: каждая точка - свежий процесс, где
+    config.yaml применяется при старте целиком.
+    """
+    from launcher import handler_class
+
+    grid = {}
+    for spec in specs:
+        key, _, values = spec.partition('=')
+        if not values:
+            raise ValueError(f"Ожидалось ключ=v1,v2,...: {spec}")
+        grid[key.strip()] = [parse_value(v.strip()) for v in values.split(',')]
+
+    known = handler_class('secure').SECURITY_CONFIG
+    unknown = [key for key in grid if key not in known]
+    if unknown:
+        raise ValueError(f"Нет в SECURITY_CONFIG: {', '.join(unknown)}")
+    return grid
+
+
+def grid_points(grid: Dict[str, list]) -> List[Dict]:
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def throughput(base_url: str, seconds: float = 3.0, concurrency: int = 8) -> Dict:
+    """
+    Закрытый цикл: concurrency потоков сырых сокетов (raw_client) шлют
+    запросы без пауз seconds секунд. rps - только ответы 200; 429/503
+    считаются отказами защиты, None - сетевыми ошибками. Задержка - до
+    закрытия соединения: нормализация времени идет после записи ответа.
+    """
+    from raw_client import RawProbeClient
+
+    path, param, value = BENCHMARK_ENDPOINT
+    client = RawProbeClient(base_url, path=path, param=param)
+    request = client.prepare(value)
+    latencies: List[int] = []
+    counts = {'rejected': 0, 'failed': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def worker():
+        local, rejected, failed = [], 0, 0
+        while time.monotonic() < deadline:
+            start = time.perf_counter_ns()
+            result = client.probe(request)
+            if result is None:
+                failed += 1
+            elif result[0] == 200:
+                local.append(time.perf_counter_ns() - start)
+            else:
+                rejected += 1
+        with lock:
+            latencies.extend(local)
+            counts['rejected'] += rejected
+            counts['failed'] += failed
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50_us': latencies[len(latencies) // 2] / 1e3 if latencies else None,
+        'p99_us': latencies[int(len(latencies) * 0.99)] / 1e3 if latencies else None,
+        **counts,
+    }
+
+
+def run_point(config: Dict, samples: int = 300, workers: int = 4, seconds: float = 3.0,
+              concurrency: int = 8) -> Dict:
+    """
+    Одна точка сетки: свежий экземпляр защищенного сервера в своем процессе
+    с config, сначала замер утечки (leakage.py), затем пропускная способность -
+    чтобы отказы лимита частоты после нагрузки не попали в замер утечки.
+    Ложный класс /execute_trade - неудачные попытки с одного IP: порог
+    ip_failed_attempts поднимается, чтобы замер не попал в черный список
+    (если ключ не перебирается в сетке).
+    """
+    from launcher import ServerCluster
+    from leakage import SECURE_PROBES, TimingLeakageHarness
+
+    security = {'ip_failed_attempts': 10 ** 9, **config}
+    # JSON - подмножество YAML: отдельный сериализатор не нужен
+    fd, config_path = tempfile.mkstemp(prefix='sweep-', suffix='.yaml')
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'secure_server': {'security': security}}, f)
+    try:
+        with ServerCluster('secure', 1, 'process', config_path=config_path) as cluster:
+            url = cluster.urls[0]
+            leakage = TimingLeakageHarness(samples=samples, max_workers=workers).run_server(url, SECURE_PROBES)
+            bench = throughput(url, seconds, concurrency)
+    finally:
+        os.unlink(config_path)
+    return {'config': config, 'samples': samples, 'throughput': bench, 'leakage': leakage}
+
+
+def failed_point(config: Dict, error: Exception) -> Dict:
+    """Точка, которую не удалось измерить (например, сервер отверг конфигурацию)"""
+    return {'config': config, 'error': str(error), 'throughput': None, 'leakage': {}}
+
+
+def is_valid(result: Dict) -> bool:
+    """
+    Точка измерена, и замер утечки полный: ни одного отказа и все замеры
+    обоих классов на каждом endpoint. Отказы защиты (черный список, лимиты)
+    выбивают замеры, и высокий p KS на неполных классах не означает, что
+    сигнал скрыт.
+    """
+    if result.get('error'):
+        return False
+    return all(r['failed'] == 0 and r['samples_true'] == r['samples_false'] == result['samples']
+               for r in result['leakage'].values())
+
+
+def hides_signal(result: Dict, alpha: float = 0.01) -> bool:
+    """Замер полный, и KS не различает классы ни на одном endpoint при данном числе замеров"""
+    return is_valid(result) and all(r['ks_pvalue'] >= alpha for r in result['leakage'].values())
+
+
+# Вердикт точки для строки прогресса
+VERDICTS = {'да': 'сигнал скрыт', 'нет': 'утечка', 'невалид': 'замер невалиден'}
+
+
+def verdict(result: Dict, alpha: float = 0.01) -> str:
+    if not is_valid(result):
+        return 'невалид'
+    return 'да' if hides_signal(result, alpha) else 'нет'
+
+
+def run_sweep(grid: Dict[str, list], parallel: Optional[int] = None, **kwargs) -> List[Dict]:
+    """
+    Все точки сетки, по parallel одновременно: каждая точка - свой процесс
+    клиента и свой процесс сервера, поэтому параллельно по умолчанию идет
+    половина ядер. Точки, идущие одновременно, делят машину - для чистого
+    сравнения задержек parallel=1.
+    """
+    points = grid_points(grid)
+    parallel = parallel or max(1, (os.cpu_count() or 1) // 2)
+    print(f" Точек: {len(points)}, параллельно: {parallel}")
+
+    results: List[Optional[Dict]] = [None] * len(points)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=parallel) as executor:
+        futures = {executor.submit(run_point, point, **kwargs): i for i, point in enumerate(points)}
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                # Ошибка одной точки не прерывает перебор
+                results[i] = failed_point(points[i], e)
+                print(f"  [{done}/{len(points)}] {points[i]}: ошибка - {e}")
+                continue
+            print(f"  [{done}/{len(points)}] {points[i]}: {results[i]['throughput']['rps']:.0f} запр/с, "
+                  f"{VERDICTS[verdict(results[i])]}")
+    return results
+
+
+def cheapest_hidden(results: List[Dict], alpha: float = 0.01) -> Optional[Dict]:
+    """Конфигурация с наибольшей пропускной способностью среди скрывающих сигнал (невалидные не в счет)"""
+    hidden = [r for r in results if hides_signal(r, alpha)]
+    return max(hidden, key=lambda r: r['throughput']['rps']) if hidden else None
+
+
+def print_sweep(results: List[Dict], alpha: float = 0.01):
+    keys = list(results[0]['config']) if results else []
+    measured = [r for r in results if not r.get('error')]
+    paths = list(measured[0]['leakage']) if measured else []
+    width = 14 * len(keys) + 34 + 24 * len(paths) + 8
+
+    print("=" * width)
+    print(" ПРОПУСКНАЯ СПОСОБНОСТЬ И УТЕЧКА ПО КОНФИГУРАЦИЯМ")
+    print("=" * width)
+    print(" " + "".join(f"{k[:13]:>14}" for k in keys)
+          + f"{'запр/с':>9}{'p50 мкс':>9}{'p99 мкс':>9}{'отказ':>7}"
+          + "".join(f"{p[:10] + ' точн/N':>24}" for p in paths) + f"{'скрыт':>8}")
+    print("-" * width)
+
+    for r in sorted(measured, key=lambda r: -r['throughput']['rps']):
+        bench = r['throughput']
+        row = " " + "".join(f"{str(r['config'][k]):>14}" for k in keys)
+        row += (f"{bench['rps']:9.0f}{bench['p50_us'] or 0:9.0f}{bench['p99_us'] or 0:9.0f}"
+                f"{bench['rejected'] + bench['failed']:7d}")
+        for path in paths:
+            leak = r['leakage'][path]
+            n = leak['samples_to_distinguish']
+            row += f"{leak['threshold_accuracy']:>15.3f}/{n if n else '∞':>8}"
+        row += f"{verdict(r, alpha):>8}"
+        print(row)
+    for r in results:
+        if r.get('error'):
+            print(" " + "".join(f"{str(r['config'][k]):>14}" for k in keys) + f"  ошибка: {r['error']}")
+    print("=" * width)
+    print(f" точн. - лучший порог на одном замере; N - замеров на класс для различения; "
+          f"скрыт - KS p >= {alpha} на всех endpoint'ах")
+    print(" невалид - часть замеров утечки отклонена сервером, точка не сравнивается")
+
+    best = cheapest_hidden(results, alpha)
+    if best:
+        print(f" Самая дешевая конфигурация, скрывающая сигнал: {best['config']} "
+              f"({best['throughput']['rps']:.0f} запр/с)")
+    else:
+        print(" Ни одна конфигурация не скрывает сигнал при этом числе замеров")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Перебор SECURITY_CONFIG: пропускная способность против утечки")
+    parser.add_argument('--grid', action='append', default=[], metavar='КЛЮЧ=v1,v2',
+                        help="значения ключа SECURITY_CONFIG (можно повторять); по умолчанию DEFAULT_GRID")
+    parser.add_argument('--parallel', type=int, help="точек одновременно (по умолчанию половина ядер)")
+    parser.add_argument('--samples', type=int, default=300, help="замеров утечки на класс")
+    parser.add_argument('--workers', type=int, default=4, help="потоков замера утечки")
+    parser.add_argument('--seconds', type=float, default=3.0, help="длительность замера пропускной способности")
+    parser.add_argument('--concurrency', type=int, default=8, help="потоков замера пропускной способности")
+    parser.add_argument('--alpha', type=float, default=0.01)
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    grid = parse_grid(args.grid) if args.grid else DEFAULT_GRID
+    results = run_sweep(grid, args.parallel, samples=args.samples, workers=args.workers,
+                        seconds=args.seconds, concurrency=args.concurrency)
+    print_sweep(results, args.alpha)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()